@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from django.conf import settings
+from django.utils import timezone
+from .models import Message
+
+logger = logging.getLogger(__name__)
+
+# write-behind buffer for chat messages
+# consumers broadcast a message as soon as it is received and leave it here,
+# the buffer inserts everything it holds with one bulk_create when it reaches
+# CHAT_BUFFER_SIZE messages or CHAT_BUFFER_INTERVAL seconds after the first one,
+# and once more when the server shuts down (see social_media_project.routing)
+# the clients already show the messages, so a batch that fails is never dropped:
+# it stays in the buffer and the next flushes wait twice as long every time (up
+# to CHAT_BUFFER_MAX_BACKOFF seconds) while the database is down; from the
+# CHAT_BUFFER_RETRIES failure on its rows are saved one by one, so a bad message
+# only holds back itself
+
+
+class MessageBuffer:
+    def __init__(self, size=None, interval=None, retries=None, max_backoff=None):
+        self.size = size or settings.CHAT_BUFFER_SIZE
+        self.interval = interval or settings.CHAT_BUFFER_INTERVAL
+        self.retries = retries or settings.CHAT_BUFFER_RETRIES
+        self.max_backoff = max_backoff or settings.CHAT_BUFFER_MAX_BACKOFF
+        self.messages = {}
+        self.failures = 0
+        self._timer = None
+        self._lock = None
+
+    @property
+    def lock(self):
+        # created lazily so it belongs to the server's event loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def add(self, message):
+        # stamped on arrival, the batch is inserted later
+        message.created = message.modified = timezone.now()
+        self.messages[str(message.id)] = message
+        # while backing off only the timer flushes
+        if len(self.messages) >= self.size and not self.failures:
+            await self.flush()
+        else:
+            self._arm()
+
+    def _arm(self):
+        if self._timer is None:
+            delay = min(self.interval * 2**self.failures, self.max_backoff)
+            self._timer = asyncio.create_task(self._flush_later(delay))
+
+    async def _flush_later(self, delay):
+        await asyncio.sleep(delay)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self):
+        async with self.lock:
+            if self._timer is not None and self._timer is not asyncio.current_task():
+                self._timer.cancel()
+            self._timer = None
+            messages, self.messages = list(self.messages.values()), {}
+            if not messages:
+                return
+            try:
+                await Message.objects.abulk_create(messages)
+            except Exception:
+                logger.exception("could not save %d chat messages", len(messages))
+                if self.failures + 1 >= self.retries:
+                    messages = await self._save_each(messages)
+                if messages:
+                    self.failures += 1
+                    # kept for the next flush, ahead of the ones added meanwhile
+                    failed = {str(m.id): m for m in messages}
+                    self.messages = {**failed, **self.messages}
+                    self._arm()
+                    return
+            self.failures = 0
+
+    async def _save_each(self, messages):
+        """saves messages one by one and returns the ones that failed"""
+        failed = []
+        for message in messages:
+            try:
+                await Message.objects.abulk_create([message])
+            except Exception:
+                logger.exception(
+                    "could not save chat message %s of room %s",
+                    message.id,
+                    message.room_id,
+                )
+                failed.append(message)
+        return failed
+
+    async def discard(self, message_id, room, sender):
+        """drops a message that is not saved yet, returns False when it is not
+        in the buffer (already saved, or not a message of sender in room)"""
+        async with self.lock:
+            message = self.messages.get(str(message_id))
+            if message is None:
+                return False
+            if message.room_id != room.id or message.sender_id != sender.id:
+                return False
+            del self.messages[str(message_id)]
+            return True
+
+
+message_buffer = MessageBuffer()
@@ -1,43 +1,73 @@
-from channels.generic.websocket import JsonWebsocketConsumer
-from asgiref.sync import async_to_sync
-from .tasks import load_realted_messages, create_db_message, delete_db_message
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.core.exceptions import ValidationError
+from social_media_project.backlog import backlog_frames, load_backlog, since_param
+from .buffer import message_buffer
+from .models import Message
 
 
-class ChatConsumer(JsonWebsocketConsumer):
-    def connect(self):
+def message_payload(message):
+    return {
+        "type": "send_message",
+        "message_id": str(message.id),
+        "sender": message.sender.username,
+        "data": message.data,
+    }
+
+
+class ChatConsumer(AsyncJsonWebsocketConsumer):
+    async def connect(self):
 
         self.user = self.scope["user"]
-        print(self.user)
-        self.room_name = self.scope["url_route"]["kwargs"]["room_name"]
-        async_to_sync(self.channel_layer.group_add)(self.room_name, self.channel_name)
-        load_realted_messages.delay(self.room_name)
-        super().connect()
-
-    def disconnect(self, code):
-        async_to_sync(self.channel_layer.group_discard)(
-            self.room_name, self.channel_name
-        )
-        return super().disconnect(code)
-
-    def receive_json(self, content, **kwargs):
+        self.room = self.scope["room"]  # rooms.Room resolved by RoomMiddleware
+        self.room_name = self.room.name
+        await self.channel_layer.group_add(self.room_name, self.channel_name)
+        await self.accept()
+        await self.send_backlog()
+
+    async def send_backlog(self):
+        await message_buffer.flush()  # the backlog is read from the database
+        messages = Message.objects.filter(room_id=self.room.id).select_related("sender")
+        messages, truncated = await load_backlog(messages, since_param(self.scope))
+        for frame in backlog_frames(messages, truncated, message_payload):
+            await self.send_json(frame)
+
+    async def disconnect(self, code):
+        await self.channel_layer.group_discard(self.room_name, self.channel_name)
+        await message_buffer.flush()
+
+    async def receive_json(self, content, **kwargs):
         if content.get("type") == "create":
-            message_data = {
-                "room_name": self.room_name,
-                "sender_id": str(self.scope["user"].id),
-                "options": {"message": content["message"]},
-            }
-            self.send_json(message_data)
-            create_db_message.delay(**message_data)
-            print("hello")
+            message = Message(
+                room_id=self.room.id,
+                sender=self.user,
+                data={"message": content["message"]},
+            )
+            await self.channel_layer.group_send(
+                self.room_name, message_payload(message)
+            )
+            await message_buffer.add(message)
 
         elif content.get("type") == "delete":
             message_id = content.get("message_id")
-            delete_db_message.delay(message_id)
+            if await message_buffer.discard(message_id, self.room, self.user):
+                # never saved, so there is no post_delete signal to announce it
+                await self.channel_layer.group_send(
+                    self.room_name,
+                    {"type": "delete_message", "message_id": str(message_id)},
+                )
+                return
+            messages = Message.objects.filter(
+                id=message_id, room_id=self.room.id, sender=self.user
+            )
+            try:
+                await messages.adelete()
+            except ValidationError:
+                pass  # not a message id
 
-    def send_message(self, event):
+    async def send_message(self, event):
         event["action"] = "send"
-        self.send_json(event)
+        await self.send_json(event)
 
-    def delete_message(self, event):
+    async def delete_message(self, event):
         event["action"] = "delete"
-        self.send_json(event)
+        await self.send_json(event)
@@ -1,6 +1,7 @@
 from django.db import models
 from notifications_app.models import AbstractMessagingModel
 from django_extensions.db.models import TimeStampedModel
+from django_extensions.db.fields import CreationDateTimeField
 from django.db.models.signals import pre_save
 from django.conf import settings
 from uuid import uuid4
@@ -8,6 +9,7 @@ from django.contrib.auth import get_user_model
 from django.core.validators import RegexValidator
 from django.core.exceptions import ValidationError
 from asgiref.sync import sync_to_async
+from django.utils import timezone
 
 # Create your models here.
 
@@ -46,9 +48,14 @@ class Message(AbstractMessagingModel):
     room = models.ForeignKey(
         to=ChatRoom, on_delete=models.CASCADE, related_name="chat_messages"
     )
+    # set when the message is received, not when its batch is inserted
+    created = CreationDateTimeField("created", auto_now_add=False, default=timezone.now)
 
     def __str__(self) -> str:
         return f"message from {self.sender.username} to room {self.room.name}"
 
     class Meta:
         db_table = "messages_db"
+        indexes = [  # backlog of a room
+            models.Index(fields=["room", "-created", "-id"]),
+        ]
@@ -0,0 +1,99 @@
+import time
+from collections import OrderedDict, namedtuple
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from .models import ChatRoom
+
+User = get_user_model()
+
+# resolves a room name to the room id and its members for chat connections,
+# results are kept in a small per-process lru in front of redis, so a connection
+# to a known room needs no database query
+
+ROOM_KEY = "room:{}"
+
+Room = namedtuple("Room", ["id", "name", "members"])  # members: {username: id}
+
+
+class LocalCache:
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.items = OrderedDict()
+
+    def get(self, key):
+        item = self.items.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < time.monotonic():
+            del self.items[key]
+            return None
+        self.items.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self.items[key] = (time.monotonic() + self.ttl, value)
+        self.items.move_to_end(key)
+        while len(self.items) > self.size:
+            self.items.popitem(last=False)
+
+    def delete(self, key):
+        self.items.pop(key, None)
+
+
+local_rooms = LocalCache(
+    settings.CHAT_ROOM_LOCAL_CACHE_SIZE, settings.CHAT_ROOM_LOCAL_CACHE_TTL
+)
+
+
+def canonical_name(room_name):
+    return "-".join(sorted(room_name.split("-")))
+
+
+def room_key(room_name):
+    return ROOM_KEY.format(room_name)
+
+
+async def load_room(room_name):
+    Membership = ChatRoom.users.through
+    rows = Membership.objects.filter(chatroom__name=room_name).values_list(
+        "chatroom_id", "user__username", "user_id"
+    )
+    rows = [row async for row in rows]
+    if len(rows) == 2:
+        return Room(
+            str(rows[0][0]), room_name, {name: str(uid) for _, name, uid in rows}
+        )
+
+    # first connection to this room
+    users = User.objects.filter(username__in=room_name.split("-"))
+    users = users.values_list("username", "id")
+    members = {name: str(uid) async for name, uid in users}
+    if len(members) != 2:
+        raise Exception(
+            'group name must contain 2 usernames in exp "username-username"'
+        )
+    room, _ = await ChatRoom.objects.aget_or_create(name=room_name)
+    return Room(str(room.id), room_name, members)
+
+
+async def resolve_room(room_name):
+    room_name = canonical_name(room_name)
+    room = local_rooms.get(room_name)
+    if room is None:
+        room = await cache.aget(room_key(room_name))
+        if room is None:
+            room = await load_room(room_name)
+            await cache.aset(
+                room_key(room_name), room, settings.CHAT_ROOM_CACHE_TIMEOUT
+            )
+        local_rooms.set(room_name, room)
+    return room
+
+
+def forget_rooms(room_names):
+    for room_name in room_names:
+        local_rooms.delete(room_name)
+    cache.delete_many([room_key(room_name) for room_name in room_names])
@@ -1,9 +1,12 @@
 from django.dispatch import receiver
 from django.db.models.signals import *
 from .models import ChatRoom, User, Message
-from asgiref.sync import async_to_sync
-from .tasks import send_client_message, delete_message_client_side
+from .rooms import forget_rooms
 from django.db.transaction import on_commit
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+channel_layer = get_channel_layer()
 
 
 @receiver(pre_save, sender=ChatRoom)
@@ -13,31 +16,52 @@ def sort_name(instance, **kwargs):
     instance.name = "-".join(usernames)
 
 
-async def get_users(room_name):
+def get_users(room_name):
     usernames = room_name.split("-")
-    users = await User.objects.ain_bulk(sorted(usernames), field_name="username")
-    return users
+    return User.objects.filter(username__in=usernames)
 
 
 @receiver(pre_save, sender=ChatRoom)
 def check_room_users(instance, **kwargs):
-    users = async_to_sync(get_users)(instance.name)
-    if not users.__len__() == 2:
+    if not get_users(instance.name).count() == 2:
         raise Exception("room must contain tow existing users")
 
 
 @receiver(post_save, sender=ChatRoom)
-def add_users(instance, **kwargs):
-    users = async_to_sync(get_users)(instance.name)
-    for user in users.values():
-        instance.users.add(user)
-
-
-@receiver(post_save, sender=Message)
-def send_room_message(instance, **kwargs):
-    on_commit(lambda: send_client_message.delay(instance.id))
+def add_users(instance, created, **kwargs):
+    if created:
+        user_ids = get_users(instance.name).values_list("id", flat=True)
+        instance.users.add(*user_ids)
 
 
 @receiver(post_delete, sender=Message)
 def delete_room_message(instance, **kwargs):
-    on_commit(lambda: delete_message_client_side.delay(instance.id, instance.room.name))
+    # sent from here like the consumers send new messages, no task needed
+    room_name = instance.room.name
+    payload = {"type": "delete_message", "message_id": str(instance.id)}
+    on_commit(lambda: async_to_sync(channel_layer.group_send)(room_name, payload))
+
+
+@receiver(post_save, sender=User)
+def forget_user_rooms(instance, update_fields=None, **kwargs):
+    if update_fields and "username" not in update_fields:
+        return
+    rooms = ChatRoom.objects.filter(users=instance).values_list("name", flat=True)
+    room_names = list(rooms)
+    if room_names:
+        on_commit(lambda: forget_rooms(room_names))
+
+
+@receiver(pre_delete, sender=User)
+def forget_deleted_user_rooms(instance, **kwargs):
+    # the memberships are gone after the delete
+    room_names = list(
+        ChatRoom.objects.filter(users=instance).values_list("name", flat=True)
+    )
+    if room_names:
+        on_commit(lambda: forget_rooms(room_names))
+
+
+@receiver(post_delete, sender=ChatRoom)
+def forget_room(instance, **kwargs):
+    on_commit(lambda: forget_rooms([instance.name]))
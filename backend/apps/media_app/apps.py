@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class MediaAppConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "media_app"
+
+    def ready(self) -> None:
+        from . import signals
@@ -0,0 +1,103 @@
+import os
+from collections import Counter
+from datetime import timedelta
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from social_media_project import derivatives
+from ...models import REFERENCES, Blob
+from ...storage import PATH, TEMP_PATH, ContentAddressedStorage
+
+
+def referenced_names():
+    """how many rows point at every blob"""
+    counts = Counter()
+    for label, (field, _) in REFERENCES.items():
+        names = (
+            apps.get_model(label)
+            .objects.filter(**{f"{field}__startswith": f"{PATH}/"})
+            .values_list(field, flat=True)
+        )
+        counts.update(names.iterator())
+    return counts
+
+
+def shows_derivatives(digest):
+    """whether a row still uses the resized copies of digest"""
+    return any(
+        apps.get_model(label).objects.filter(**{field: digest}).exists()
+        for label, (_, field) in REFERENCES.items()
+    )
+
+
+def collect(storage, name):
+    """deletes the blob unless it was referenced again meanwhile, its row stays
+    locked until the file and its unused resized copies are gone, so an upload of
+    the same content waits for it and stores the file again, and the copies are
+    made again by the derivatives task that runs after that upload"""
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(name=name, refs__lte=0)
+        if not blob.values_list("name", flat=True):
+            return False
+        storage.delete(name)
+        digest = storage.digest(name)
+        if not shows_derivatives(digest):
+            derivatives.delete_derivatives(digest)
+        blob.delete()
+    return True
+
+
+def old_temp_files(storage, cutoff):
+    """paths of the uploads a crash left in TEMP_PATH before cutoff"""
+    directory = storage.path(TEMP_PATH)
+    if not os.path.isdir(directory):
+        return []
+    return [
+        entry.path
+        for entry in os.scandir(directory)
+        if entry.is_file() and entry.stat().st_mtime < cutoff.timestamp()
+    ]
+
+
+class Command(BaseCommand):
+    """django command to recount the references of the blobs and delete the ones no row points at"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-hours",
+            type=float,
+            default=settings.BLOB_GRACE_HOURS,
+            help="younger unreferenced blobs are kept (uploads in flight)",
+        )
+        parser.add_argument("--dry-run", action="store_true")
+
+    def recount(self):
+        counts, recounted = referenced_names(), 0
+        for name, refs in Blob.objects.values_list("name", "refs").iterator():
+            if counts[name] != refs:
+                recounted += Blob.objects.filter(name=name).update(refs=counts[name])
+        self.stdout.write(f"{recounted} blobs recounted")
+
+    def handle(self, *args, **options):
+        self.recount()
+        cutoff = timezone.now() - timedelta(hours=options["grace_hours"])
+        orphans = Blob.objects.filter(refs__lte=0, modified__lt=cutoff)
+        storage, deleted, freed = ContentAddressedStorage(), 0, 0
+        for name, size in orphans.values_list("name", "size").iterator():
+            if options["dry_run"]:
+                self.stdout.write(f"would delete {name}")
+            elif not collect(storage, name):
+                continue
+            deleted, freed = deleted + 1, freed + size
+        # uploads in flight are younger than the grace period
+        temp_files = old_temp_files(storage, cutoff)
+        if not options["dry_run"]:
+            for path in temp_files:
+                os.remove(path)
+        self.stdout.write(f"{len(temp_files)} abandoned temp files")
+        done = "found" if options["dry_run"] else "deleted"
+        self.stdout.write(
+            self.style.SUCCESS(f"{deleted} unreferenced blobs ({freed} bytes) {done}")
+        )
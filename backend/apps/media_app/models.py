@@ -0,0 +1,50 @@
+from collections import Counter, defaultdict
+from django.db import models
+from django.db.models import F
+from django.utils import timezone
+from django_extensions.db.models import TimeStampedModel
+
+# file fields of the uploads that reference the blobs of
+# media_app.storage.ContentAddressedStorage, with the digest fields of their
+# resized copies (social_media_project.derivatives)
+# model label: (file field, digest field)
+REFERENCES = {
+    "posts_app.Attachment": ("file", "digest"),
+    "users_app.User": ("profile_pic", "profile_pic_digest"),
+}
+
+
+class Blob(TimeStampedModel):
+    """a file stored once under its content digest, refs counts the rows
+    pointing at it; modified is touched on every count change"""
+
+    name = models.CharField(max_length=255, primary_key=True)
+    size = models.PositiveBigIntegerField(default=0)
+    refs = models.IntegerField(default=0)
+
+    @staticmethod
+    def reference(name, size):
+        """one reference more, the update waits while collectblobs holds the row"""
+        blobs = Blob.objects.filter(name=name)
+        if blobs.update(refs=F("refs") + 1, modified=timezone.now()):
+            return
+        _, created = Blob.objects.get_or_create(
+            name=name, defaults={"size": size, "refs": 1}
+        )
+        if not created:  # created by a concurrent upload
+            blobs.update(refs=F("refs") + 1, modified=timezone.now())
+
+    @staticmethod
+    def release(names):
+        """one reference less for every name, names of other storages are ignored"""
+        by_count = defaultdict(list)
+        for name, count in Counter(name for name in names if name).items():
+            by_count[count].append(name)
+        for count, names in by_count.items():
+            Blob.objects.filter(name__in=names).update(
+                refs=F("refs") - count, modified=timezone.now()
+            )
+
+    class Meta:
+        db_table = "blobs_db"
+        indexes = [models.Index(fields=["refs", "modified"])]
@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete, pre_save
+from .models import REFERENCES, Blob
+
+# keeps Blob.refs up to date for the usual paths, collectblobs recounts them
+# for the rest (raw deletes, cleared fields)
+
+
+def release_replaced(sender, instance, **kwargs):
+    field, _ = REFERENCES[sender._meta.label]
+    file = getattr(instance, field)
+    # a file assigned since the last save replaces the stored one
+    if instance._state.adding or not file or file._committed:
+        return
+    old = sender.objects.filter(pk=instance.pk).values_list(field, flat=True)
+    Blob.release(old)
+
+
+def release_deleted(sender, instance, **kwargs):
+    field, _ = REFERENCES[sender._meta.label]
+    Blob.release([getattr(instance, field).name])
+
+
+for label in REFERENCES:
+    pre_save.connect(release_replaced, sender=label)
+    post_delete.connect(release_deleted, sender=label)
@@ -0,0 +1,64 @@
+import hashlib
+import os
+from tempfile import NamedTemporaryFile
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+
+# content addressed storage of the uploads, opt-in with CONTENT_ADDRESSED_UPLOADS
+# a file is hashed while it is copied to disk and kept once under its sha256
+# (blobs/<xx>/<digest>.<ext>) however many rows upload it, so its url is stable;
+# Blob rows count the references and collectblobs deletes the unreferenced files
+
+PATH = "blobs"
+# uploads being hashed, on the same filesystem so they are renamed in place;
+# collectblobs deletes the ones a crash left behind
+TEMP_PATH = f"{PATH}/tmp"
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    @staticmethod
+    def blob_name(digest, name):
+        extension = os.path.splitext(name)[1].lower()
+        return f"{PATH}/{digest[:2]}/{digest}{extension}"
+
+    @staticmethod
+    def digest(name):
+        """sha256 of the content of a blob, None for other names"""
+        if not name or not name.startswith(f"{PATH}/"):
+            return None
+        return os.path.splitext(os.path.basename(name))[0]
+
+    def _save(self, name, content):
+        from .models import Blob
+
+        directory = self.path(TEMP_PATH)
+        os.makedirs(directory, exist_ok=True)
+        sha, size = hashlib.sha256(), 0
+        temp = NamedTemporaryFile(dir=directory, delete=False)
+        try:
+            with temp:
+                for chunk in content.chunks():
+                    sha.update(chunk)
+                    temp.write(chunk)
+                    size += len(chunk)
+            name = self.blob_name(sha.hexdigest(), name)
+            # counted first, it waits for collectblobs if it is deleting the blob
+            # and keeps it from being collected, then the file is checked
+            Blob.reference(name, size)
+            full_path = self.path(name)
+            if not os.path.exists(full_path):  # stored before otherwise
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                os.replace(temp.name, full_path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(full_path, self.file_permissions_mode)
+        finally:
+            if os.path.exists(temp.name):
+                os.remove(temp.name)
+        return name
+
+
+def uploads_storage():
+    """storage of the file fields in media_app.models.REFERENCES"""
+    if settings.CONTENT_ADDRESSED_UPLOADS:
+        return ContentAddressedStorage()
+    return default_storage
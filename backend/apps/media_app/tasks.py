@@ -0,0 +1,8 @@
+from celery import shared_task
+from django.core.management import call_command
+
+
+@shared_task(name="collect_blobs")
+def collect_blobs():
+    call_command("collectblobs")
+    return True
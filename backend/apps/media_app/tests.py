@@ -0,0 +1,71 @@
+import os
+import tempfile
+from io import StringIO
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from posts_app.models import Attachment, Post
+from .models import Blob
+from .storage import TEMP_PATH, ContentAddressedStorage
+
+User = get_user_model()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ContentAddressedStorageTest(TestCase):
+    def setUp(self):
+        self.storage = ContentAddressedStorage()
+
+    def test_same_content_is_stored_once(self):
+        first = self.storage.save("post_files/a.PNG", ContentFile(b"image"))
+        second = self.storage.save("profile_pic/b.png", ContentFile(b"image"))
+        self.assertEqual(first, second)
+        self.assertTrue(first.startswith("blobs/") and first.endswith(".png"))
+        self.assertEqual(self.storage.digest(first), first[-68:-4])
+        blob = Blob.objects.get()
+        self.assertEqual((blob.refs, blob.size), (2, 5))
+
+    def test_missing_file_is_stored_again(self):
+        # the blob was collected while the same content was uploaded
+        name = self.storage.save("post_files/a.txt", ContentFile(b"a"))
+        os.remove(self.storage.path(name))
+        self.assertEqual(self.storage.save("post_files/b.txt", ContentFile(b"a")), name)
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(Blob.objects.get().refs, 2)
+
+    def test_release(self):
+        name = self.storage.save("post_files/a.txt", ContentFile(b"a"))
+        Blob.release([name, "post_files/other.txt", None])
+        self.assertEqual(Blob.objects.get().refs, 0)
+
+    def test_collect_orphans(self):
+        user = User.objects.create_user(
+            username="user_name",
+            email="user_name@gmail.com",
+            password="password",
+            first_name="first_name",
+            last_name="last_name",
+        )
+        post = Post.objects.create(user=user, text="post")
+        kept = self.storage.save("post_files/a.txt", ContentFile(b"a"))
+        orphan = self.storage.save("post_files/b.txt", ContentFile(b"b"))
+        Attachment.objects.create(post=post, file=kept)
+        # both files were counted when saved, only one row was written
+        Blob.objects.update(modified=timezone.now() - timedelta(days=2))
+        call_command("collectblobs", stdout=StringIO())
+        self.assertEqual(list(Blob.objects.values_list("name", "refs")), [(kept, 1)])
+        self.assertTrue(self.storage.exists(kept))
+        self.assertFalse(self.storage.exists(orphan))
+
+    def test_collect_abandoned_temp_files(self):
+        self.storage.save("post_files/a.txt", ContentFile(b"a"))  # makes the dir
+        abandoned = self.storage.path(f"{TEMP_PATH}/tmpabandoned")
+        with open(abandoned, "wb") as file:
+            file.write(b"half an upload")
+        old = (timezone.now() - timedelta(days=2)).timestamp()
+        os.utime(abandoned, (old, old))
+        call_command("collectblobs", stdout=StringIO())
+        self.assertEqual(os.listdir(self.storage.path(TEMP_PATH)), [])
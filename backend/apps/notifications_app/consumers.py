@@ -1,28 +1,30 @@
-from channels.generic.websocket import JsonWebsocketConsumer
-import json
-from channels.exceptions import DenyConnection
-from asgiref.sync import async_to_sync
-from .tasks import load_related_notifications
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from social_media_project.backlog import backlog_frames, load_backlog, since_param
+from .models import Notification
+from .tasks import notification_payload
 
 
-class NotificationConsumer(JsonWebsocketConsumer):
-    def connect(self):
+class NotificationConsumer(AsyncJsonWebsocketConsumer):
+    async def connect(self):
 
         self.user = self.scope["user"]
         self.group_name = str(self.user.username)
-        self.accept()
-        async_to_sync(self.channel_layer.group_add)(self.group_name, self.channel_name)
-        load_related_notifications.delay(self.group_name)
+        await self.accept()
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.send_backlog()
 
-    def disconnect(self, close_code=None):
-        async_to_sync(self.channel_layer.group_discard)(
-            self.group_name, self.channel_name
-        )
-        pass
+    async def send_backlog(self):
+        notifs = Notification.objects.filter(receiver=self.user)
+        notifs, truncated = await load_backlog(notifs, since_param(self.scope))
+        for frame in backlog_frames(notifs, truncated, notification_payload):
+            await self.send_json(frame)
 
-    def send_notification(self, payload):
-        self.send_json(content=payload)
+    async def disconnect(self, close_code=None):
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
-    def delete_notification(self, event):
+    async def send_notification(self, payload):
+        await self.send_json(content=payload)
+
+    async def delete_notification(self, event):
         event["action"] = "delete"
-        self.send_json(event)
+        await self.send_json(event)
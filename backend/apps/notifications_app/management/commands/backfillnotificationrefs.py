@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from ...models import Notification, NotificationRef
+
+
+class Command(BaseCommand):
+    """django command to create the reference rows of notifications created before they existed"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        last_pk, created = None, 0
+        notifications = Notification.objects.order_by("pk").only("pk", "data")
+        while True:
+            batch = notifications
+            if last_pk:
+                batch = batch.filter(pk__gt=last_pk)
+            batch = list(batch[: options["batch_size"]])
+            if not batch:
+                break
+            refs = [
+                ref
+                for notification in batch
+                for ref in NotificationRef.from_data(notification, notification.data)
+            ]
+            NotificationRef.objects.bulk_create(refs, ignore_conflicts=True)
+            created += len(refs)
+            last_pk = batch[-1].pk
+            self.stdout.write(f"{created} references up to notification {last_pk}")
+        self.stdout.write(self.style.SUCCESS(f"{created} references created"))
@@ -1,14 +1,20 @@
 from django.utils import timezone
-from django.core.management.base import BaseCommand
-from ...models import Notification
+from social_media_project.querysets import raw_delete
+from social_media_project.retention import BatchDeleteCommand
+from ...models import Notification, NotificationRef
 
 
-class Command(BaseCommand):
+class Command(BatchDeleteCommand):
     """django command to delete notifications after one day from seeing them"""
 
-    def handle(self, *args, **options):
-        seen_notifs = Notification.objects.filter(
-            modified=timezone.now() - timezone.timedelta(days=1),
+    def get_queryset(self):
+        return Notification.objects.filter(
+            modified__lt=timezone.now() - timezone.timedelta(days=1),
             seen=True,
         )  # Queryset to get seen notifications
-        seen_notifs.delete()
+
+    def delete_rows(self, pks):
+        # raw deletes, the receivers read these notifications already so no
+        # client notice (a query and a task per row) is sent for them
+        raw_delete(NotificationRef.objects.filter(notification_id__in=pks))
+        return raw_delete(Notification.objects.filter(id__in=pks))
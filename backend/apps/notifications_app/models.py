@@ -11,11 +11,11 @@ User = settings.AUTH_USER_MODEL
 class AbstractMessagingModel(TimeStampedModel):
     id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
     sender = models.ForeignKey(
-        User, on_delete=models.CASCADE, related_name="sent_messages"
+        User, on_delete=models.CASCADE, related_name="sent_%(class)ss"
     )
     data = models.JSONField(null=True, blank=True)
 
-    class Model:
+    class Meta:
         abstract = True
 
 
@@ -36,3 +36,42 @@ class Notification(AbstractMessagingModel):
 
     class Meta:
         db_table = "notifications_db"
+        indexes = [
+            models.Index(fields=["receiver", "-created", "-id"]),
+            # unread notifications of a user
+            models.Index(fields=["receiver", "seen", "-created", "-id"]),
+            # clearreadnotifications only looks at read ones
+            models.Index(
+                fields=["modified"],
+                condition=models.Q(seen=True),
+                name="notifications_read_modified",
+            ),
+        ]
+
+
+class NotificationRef(models.Model):
+    """an object a notification is about, one row for every reference key
+    (post_id, comment_id, ...) in the notification data, so the notifications
+    of a deleted object are found with an index lookup instead of a json scan"""
+
+    KEYS = ("post_id", "comment_id", "reply_id", "like_id", "following_relation_id")
+
+    notification = models.ForeignKey(
+        Notification, on_delete=models.CASCADE, related_name="refs"
+    )
+    key = models.CharField(max_length=30)
+    value = models.CharField(max_length=64)
+
+    @classmethod
+    def from_data(cls, notification, data):
+        data = data or {}
+        return [
+            cls(notification_id=notification.id, key=key, value=str(data[key]))
+            for key in cls.KEYS
+            if data.get(key)
+        ]
+
+    class Meta:
+        db_table = "notification_refs_db"
+        unique_together = ["notification", "key"]
+        indexes = [models.Index(fields=["key", "value"])]
@@ -1,10 +1,15 @@
 from __future__ import absolute_import, unicode_literals
+import asyncio
+from uuid import uuid5
 from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
 from django.core.management import call_command
-from .models import Notification
+from .models import Notification, NotificationRef
 from django.contrib.auth import get_user_model
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
+from users_app.models import Follow
 
 User = get_user_model()
 channel_layer = get_channel_layer()
@@ -29,34 +34,86 @@ def create_notification(sender_id, receiver_id, options: dict = None):
         "receiver": User.objects.get(id=receiver_id),
         "data": options,
     }
-    Notification.objects.create(**data)
+    notification = Notification.objects.create(**data)
+    refs = NotificationRef.from_data(notification, options)
+    NotificationRef.objects.bulk_create(refs)
     return f"notification created"
 
 
-@shared_task(name="send_notifications")
-def send_client_notification(notif_id):
-    notif = Notification.objects.get(id=notif_id)
-    payload = {
+def notification_payload(notif):
+    return {
         "type": "send.notification",
         "notification_id": str(notif.id),
-        "sender_id": str(notif.sender.id),
+        "sender_id": str(notif.sender_id),
         "data": notif.data,
         "is_read": notif.seen,
     }
+
+
+@shared_task(name="send_notifications")
+def send_client_notification(notif_id):
+    notif = Notification.objects.select_related("receiver").get(id=notif_id)
+    payload = notification_payload(notif)
     async_to_sync(channel_layer.group_send)(notif.receiver.username, payload)
     return "notification sent successfully"
 
 
-@shared_task(name="load_notifications")
-def load_related_notifications(username):
-    notifs = Notification.objects.filter(receiver__username=username)
-    for notif in notifs:
-        send_client_notification.delay(notif_id=notif.id)
+async def group_send_many(messages):
+    await asyncio.gather(
+        *(channel_layer.group_send(group, payload) for group, payload in messages)
+    )
+
+
+def notify_followers(sender, options: dict, source_id):
+    """creates a notification for every follower of sender in batches with
+    bulk_create and publishes each batch with one channel layer call,
+    the last follow id of every batch is checkpointed so a retried task resumes
+    where it stopped, notification ids are derived from source_id (uuid of the
+    notified object) and the receiver so a replayed batch is not inserted twice"""
+    checkpoint = f"notify-followers:{source_id}"
+    last_id = cache.get(checkpoint, 0)
+    followers = Follow.objects.filter(to_user=sender).order_by("id")
+    while True:
+        batch = list(
+            followers.filter(id__gt=last_id).values_list(
+                "id", "from_user_id", "from_user__username"
+            )[: settings.NOTIFICATION_FANOUT_BATCH_SIZE]
+        )
+        if not batch:
+            break
+        notifications = [
+            Notification(
+                id=uuid5(source_id, str(receiver_id)),
+                sender=sender,
+                receiver_id=receiver_id,
+                data=options,
+            )
+            for _, receiver_id, _ in batch
+        ]
+        Notification.objects.bulk_create(notifications, ignore_conflicts=True)
+        refs = [
+            ref
+            for notif in notifications
+            for ref in NotificationRef.from_data(notif, options)
+        ]
+        NotificationRef.objects.bulk_create(refs, ignore_conflicts=True)
+        async_to_sync(group_send_many)(
+            [
+                (username, notification_payload(notif))
+                for notif, (_, _, username) in zip(notifications, batch)
+            ]
+        )
+        last_id = batch[-1][0]
+        cache.set(checkpoint, last_id, timeout=60 * 60 * 24)
+    cache.delete(checkpoint)
 
 
 @shared_task(name="delete_instance_notification")
 def delete_notifications(obj_id, search_word: str):
-    notifications = Notification.objects.filter(data__contains={search_word: obj_id})
+    refs = NotificationRef.objects.filter(key=search_word, value=str(obj_id))
+    notifications = Notification.objects.filter(
+        id__in=refs.values("notification_id")
+    )
     notifications.delete()
 
 
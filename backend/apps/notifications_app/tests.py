@@ -1,6 +1,57 @@
+from datetime import timedelta
+from io import StringIO
+from uuid import uuid4
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+from .models import Notification, NotificationRef
+from .tasks import create_notification, delete_notifications
 
-# Create your tests here.
+User = get_user_model()
 
-y = "h;g;g;"
-print()
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username,
+        email=f"{username}@gmail.com",
+        password="password",
+        first_name="first_name",
+        last_name="last_name",
+    )
+
+
+class DeleteNotificationsTest(TestCase):
+    def setUp(self):
+        self.sender = create_user("sender_name")
+        self.receiver = create_user("receiver_name")
+
+    def notify(self, **options):
+        create_notification(self.sender.id, self.receiver.id, options)
+
+    def test_deletes_every_notification_referencing_the_object(self):
+        # the ids arrive as strings, the tasks send them through json
+        post_id, other_post_id = str(uuid4()), str(uuid4())
+        self.notify(post_id=post_id, comment_id=str(uuid4()))
+        self.notify(post_id=post_id, like_id=str(uuid4()))
+        self.notify(post_id=other_post_id)
+
+        delete_notifications(post_id, "post_id")
+        remaining = Notification.objects.values_list("refs__value", flat=True)
+        self.assertEqual(list(remaining), [other_post_id])
+
+
+class ClearReadNotificationsTest(TestCase):
+    def test_deletes_old_read_notifications_with_their_refs(self):
+        sender, receiver = create_user("sender_name"), create_user("receiver_name")
+        for _ in range(3):
+            create_notification(sender.id, receiver.id, {"post_id": str(uuid4())})
+        unread = Notification.objects.first()
+        Notification.objects.exclude(id=unread.id).update(seen=True)
+        Notification.objects.update(modified=timezone.now() - timedelta(days=2))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            call_command("clearreadnotifications", stdout=StringIO())
+        self.assertEqual(list(Notification.objects.all()), [unread])
+        self.assertEqual(NotificationRef.objects.count(), 1)
+        self.assertEqual(callbacks, [])  # no client notice per row
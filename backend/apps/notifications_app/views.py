@@ -8,7 +8,7 @@ from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiPara
 # Create your views here.
 class PublicView(GenericAPIView):
     serializer_class = NotificationSerialzier
-    queryset = Notification.objects.all()
+    queryset = Notification.objects.select_related("sender", "receiver")
 
     def check_user_permissions(self, request):
         username = request.resolver_match.kwargs.get("username")
@@ -25,13 +25,21 @@ class PublicView(GenericAPIView):
                 name="fields",
                 description="select fields you want to be represented, otherwise it will return all fields",
             ),
+            OpenApiParameter(
+                name="seen",
+                description="only read (true) or unread (false) notifications",
+                type=bool,
+            ),
         ],
     ),
 )
 class ListNotifications(PublicView, ListModelMixin):
     def filter_queryset(self, queryset):
         queryset = queryset.filter(receiver=self.request.user)
-        return request
+        seen = self.request.GET.get("seen", "")
+        if seen in ("true", "false"):
+            queryset = queryset.filter(seen=seen == "true")
+        return queryset
 
     def get(self, request, *args, **kwargs):
         self.check_user_permissions(request)
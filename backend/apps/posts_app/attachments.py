@@ -0,0 +1,48 @@
+from django.db import transaction
+from django.db.models import Count, Max
+from rest_framework.generics import get_object_or_404
+from rest_framework.validators import ValidationError
+from social_media_project.response_cache import bump_on_commit
+from .models import Attachment, Post
+from .tasks import make_attachment_derivatives
+
+# adding files to a post in one statement instead of one save per file
+# the post row is locked before its attachments are counted, so concurrent
+# requests queue on it and cannot pass Attachment.MAX_PER_POST;
+# bulk_create skips the signals, their work is done here for all the files
+
+
+def _locked_state(post_id):
+    """(attachments count, next _order) of the post, locked until commit"""
+    locked = Post.objects.select_for_update().values_list("pk", flat=True)
+    get_object_or_404(locked, pk=post_id)
+    # a statement of its own: under read committed, a statement that waited for
+    # the lock still reads the snapshot taken before the holder committed
+    state = Attachment.objects.filter(post_id=post_id).aggregate(
+        count=Count("*"), last=Max("_order")
+    )
+    next_order = 0 if state["last"] is None else state["last"] + 1
+    return state["count"], next_order
+
+
+@transaction.atomic
+def add_attachments(post, files):
+    """stores files (None for an empty attachment) as attachments of post,
+    in order after the existing ones"""
+    count, next_order = _locked_state(post.pk)
+    if count + len(files) > Attachment.MAX_PER_POST:
+        raise ValidationError(
+            f"cannot add more than {Attachment.MAX_PER_POST} files for a post"
+        )
+    # _order is set the way order_with_respect_to sets it on save
+    attachments = Attachment.objects.bulk_create(
+        Attachment(post=post, file=file, _order=next_order + position)
+        for position, file in enumerate(files)
+    )
+    for attachment in attachments:
+        if attachment.file:
+            transaction.on_commit(
+                lambda pk=attachment.pk: make_attachment_derivatives.delay(pk)
+            )
+    bump_on_commit(f"post:{post.pk}")
+    return attachments
@@ -0,0 +1,106 @@
+from asgiref.sync import async_to_sync
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from media_app.models import Blob
+from notifications_app.models import Notification, NotificationRef
+from notifications_app.tasks import group_send_many
+from social_media_project.querysets import raw_delete
+from social_media_project.response_cache import bump_on_commit
+from .models import Attachment, Comment, Like, Post
+from .search import get_engine
+
+# set based deletion of a post or a comment with everything that hangs on it
+# (replies, likes, attachments, notifications), the rows are deleted with a few
+# DELETE ... WHERE statements instead of the orm collector, so no per-object
+# signal or task runs; the work the signals would do (counters, caches, search
+# index, client notices) is done here once for the whole tree
+
+# ids per statement when they are sent as parameters
+CHUNK_SIZE = 500
+
+
+def _purge_notifications(key, values):
+    """deletes the notifications referencing one of values under key and tells
+    their receivers"""
+    refs = NotificationRef.objects.filter(key=key, value__in=[str(v) for v in values])
+    notifications = Notification.objects.filter(id__in=refs.values("notification_id"))
+    notices = [
+        (receiver, {"type": "delete.notification", "notification_id": str(notif_id)})
+        for notif_id, receiver in notifications.values_list("id", "receiver__username")
+    ]
+    notif_ids = [notice["notification_id"] for _, notice in notices]
+    for start in range(0, len(notif_ids), CHUNK_SIZE):
+        chunk = notif_ids[start : start + CHUNK_SIZE]
+        raw_delete(NotificationRef.objects.filter(notification_id__in=chunk))
+        raw_delete(Notification.objects.filter(id__in=chunk))
+    if notices:
+        transaction.on_commit(lambda: async_to_sync(group_send_many)(notices))
+
+
+def _comment_tree(comment):
+    """ids of comment and of all its replies, level by level"""
+    tree, level = [comment.id], [comment.id]
+    while level:
+        replies = Comment.objects.filter(parent__in=level)
+        level = list(replies.values_list("id", flat=True))
+        tree.extend(level)
+    return tree
+
+
+def _purge_comments(comments):
+    comment_ids = comments.values("id")
+    raw_delete(Like.objects.filter(content_type="comment", object_id__in=comment_ids))
+    get_engine().remove_many(comments)
+    # replies point at their parents, all of them go in the same statement
+    raw_delete(comments)
+
+
+@transaction.atomic
+def purge_post(post_id):
+    from .tasks import remove_post_from_timelines  # the tasks import this module
+
+    post = Post.objects.select_related("user").filter(id=post_id).first()
+    if post is None:
+        return 0
+    # comments, replies and likes notifications all carry the post id
+    _purge_notifications("post_id", [post.id])
+    raw_delete(Like.objects.filter(content_type="post", object_id=post.id))
+    _purge_comments(Comment.objects.filter(post=post))
+    attachments = Attachment.objects.filter(post=post)
+    Blob.release(attachments.values_list("file", flat=True))
+    raw_delete(attachments)
+    posts = Post.objects.filter(id=post.id)
+    get_engine().remove_many(posts)
+    raw_delete(posts)
+    # the post stays in the home timelines it was pushed to otherwise
+    transaction.on_commit(
+        lambda: remove_post_from_timelines.delay(post.id, post.user_id)
+    )
+    bump_on_commit(
+        f"post:{post.id}",
+        f"user-posts:{post.user.username}",
+        f"comments:{post.id}",
+        f"celebrity-posts:{post.user_id}",
+    )
+    return post.comments_count + 1
+
+
+@transaction.atomic
+def purge_comment(comment_id):
+    comment = Comment.objects.filter(id=comment_id).first()
+    if comment is None:
+        return 0
+    comment_ids = _comment_tree(comment)
+    # replies and likes notifications carry the id of the comment they belong to
+    _purge_notifications("comment_id", comment_ids)
+    _purge_comments(Comment.objects.filter(id__in=comment_ids))
+    Post.objects.filter(id=comment.post_id).update(
+        comments_count=Greatest(F("comments_count") - len(comment_ids), 0)
+    )
+    if comment.parent_id:
+        Comment.objects.filter(id=comment.parent_id).update(
+            replies_count=Greatest(F("replies_count") - 1, 0)
+        )
+    bump_on_commit(f"post:{comment.post_id}", f"comments:{comment.post_id}")
+    return len(comment_ids)
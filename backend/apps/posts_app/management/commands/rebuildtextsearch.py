@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from ...models import Comment, Post
+from ...search import get_engine
+
+
+class Command(BaseCommand):
+    """django command to rebuild the full-text search index of posts and comments"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        engine = get_engine()
+        for model in (Post, Comment):
+            count = engine.rebuild(model, options["batch_size"])
+            self.stdout.write(f"{model._meta.verbose_name}: {count} indexed")
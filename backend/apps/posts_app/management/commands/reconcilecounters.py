@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from users_app.models import Block, Follow, User
+from ...models import Comment, Like, Post
+
+
+def count_of(queryset, field):
+    counts = (
+        queryset.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(count=Count("*"))
+        .values("count")
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+class Command(BaseCommand):
+    """django command to recalculate the denormalized likes, comments, replies and relations counters"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def reconcile(self, model, batch_size, **counters):
+        last_pk, updated = None, 0
+        while True:
+            pks = model.objects.order_by("pk")
+            if last_pk:
+                pks = pks.filter(pk__gt=last_pk)
+            pks = list(pks.values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                break
+            # one UPDATE with correlated counts per batch
+            updated += model.objects.filter(pk__in=pks).update(**counters)
+            last_pk = pks[-1]
+        self.stdout.write(f"{model.__name__}: {updated} rows reconciled")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        self.reconcile(
+            Post,
+            batch_size,
+            likes_count=count_of(Like.objects.filter(content_type="post"), "object_id"),
+            comments_count=count_of(Comment.objects.all(), "post"),
+        )
+        self.reconcile(
+            Comment,
+            batch_size,
+            likes_count=count_of(
+                Like.objects.filter(content_type="comment"), "object_id"
+            ),
+            replies_count=count_of(Comment.objects.all(), "parent"),
+        )
+        self.reconcile(
+            User,
+            batch_size,
+            followers_count=count_of(Follow.objects.all(), "to_user"),
+            followings_count=count_of(Follow.objects.all(), "from_user"),
+            blockers_count=count_of(Block.objects.all(), "to_user"),
+            blockings_count=count_of(Block.objects.all(), "from_user"),
+        )
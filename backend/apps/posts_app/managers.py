@@ -0,0 +1,35 @@
+from django.apps import apps
+from django.db import models
+
+
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        # loads authors with the posts and all attachments of a page in one query,
+        # counters are read from the denormalized columns
+        return self.select_related("user").prefetch_related("attachments")
+
+    def with_viewer_state(self, user):
+        return self.annotate(liked_by_me=liked_by(user, "post"))
+
+
+class CommentQuerySet(models.QuerySet):
+    def for_feed(self):
+        return self.select_related("user")
+
+    def with_viewer_state(self, user):
+        return self.annotate(liked_by_me=liked_by(user, "comment"))
+
+
+def liked_by(user, content_type, outer_ref="pk"):
+    """EXISTS subquery telling whether user liked the outer row, answered by the
+    (user, object_id, content_type) unique index"""
+    Like = apps.get_model("posts_app", "Like")
+    likes = Like.objects.filter(
+        user=user, content_type=content_type, object_id=models.OuterRef(outer_ref)
+    )
+    return models.Exists(likes)
+
+
+class LikeQuerySet(models.QuerySet):
+    def of(self, content_type, object_id):
+        return self.filter(content_type=content_type, object_id=object_id)
@@ -1,9 +1,11 @@
-from functools import cached_property
 from django.db import models
 from django_extensions.db.models import TimeStampedModel
 from rest_framework.validators import ValidationError
 from django.conf import settings
+from media_app.storage import uploads_storage
 from .path_generation import PathAndRename, uuid4
+from .managers import CommentQuerySet, LikeQuerySet, PostQuerySet
+from .search import text_search_indexes
 
 User = settings.AUTH_USER_MODEL
 
@@ -18,16 +20,27 @@ class TextualObject(TimeStampedModel):
 
 
 class Post(TextualObject):
-    @cached_property
+    # denormalized counters, kept up to date by posts_app.signals
+    likes_count = models.PositiveIntegerField(default=0, editable=False)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
+
+    @property
     def count_comments(self):
-        return self.comments.count()
+        return self.comments_count
 
-    @cached_property
+    @property
     def count_likes(self):
-        return Like.objects.filter(object_id=self.id, content_type="post").count()
+        return self.likes_count
 
     class Meta:
         db_table = "posts_db"
+        indexes = [  # backs the keyset pagination of home and user posts
+            models.Index(fields=["-created", "-id"]),
+            models.Index(fields=["user", "-created", "-id"]),
+            *text_search_indexes("posts"),
+        ]
 
 
 class Comment(TextualObject):
@@ -41,19 +54,30 @@ class Comment(TextualObject):
         db_index=True,
     )
 
+    # denormalized counters, kept up to date by posts_app.signals
+    likes_count = models.PositiveIntegerField(default=0, editable=False)
+    replies_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = CommentQuerySet.as_manager()
+
     @property
     def count_replies(self):
-        return self.replies.count()
+        return self.replies_count
 
-    @cached_property
+    @property
     def count_likes(self):
-        return Like.objects.filter(object_id=self.id, content_type="comment").count()
+        return self.likes_count
 
     class Meta:
         db_table = "comments_db"
+        indexes = [  # backs the keyset pagination of comments and replies
+            models.Index(fields=["post", "parent", "-created", "-id"]),
+            models.Index(fields=["parent", "-created", "-id"]),
+            *text_search_indexes("comments"),
+        ]
 
 
-class Like(models.Model):
+class Like(TimeStampedModel):
     id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -62,6 +86,8 @@ class Like(models.Model):
     content_type = models.CharField(max_length=10, choices=TYPES)
     object_id = models.UUIDField()
 
+    objects = LikeQuerySet.as_manager()
+
     def validate_unique(self, *args, **kwargs) -> None:
         try:
             return super().validate_unique(*args, **kwargs)
@@ -77,7 +103,13 @@ class Like(models.Model):
 
     class Meta:
         indexes = [  # to search quickly by these fields
-            models.Index(fields=["content_type", "object_id"]),
+            # the likers of an object come from the index alone (include is
+            # only used on postgresql)
+            models.Index(
+                fields=["content_type", "object_id", "-created", "-id"],
+                include=["user"],
+                name="likes_object_user",
+            ),
         ]
         unique_together = ["user", "object_id", "content_type"]
         db_table = "likes_db"
@@ -87,12 +119,22 @@ class Attachment(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="attachments")
     file = models.FileField(
-        upload_to=PathAndRename("post_files/"), blank=True, null=True
+        upload_to=PathAndRename("post_files/"),
+        storage=uploads_storage,
+        blank=True,
+        null=True,
     )
+    # sha256 of the file once its resized copies are made (images only)
+    digest = models.CharField(max_length=64, blank=True, editable=False)
+
+    MAX_PER_POST = 2
 
     def clean(self) -> None:
-        if self.post.attachments.count() == 2:
-            raise ValidationError("cannot add more than 2 files for a post")
+        # single saves only, the api adds files with attachments.add_attachments
+        if self.post.attachments.count() >= self.MAX_PER_POST:
+            raise ValidationError(
+                f"cannot add more than {self.MAX_PER_POST} files for a post"
+            )
         return super().clean()
 
     def save(self, *args, **kwargs):
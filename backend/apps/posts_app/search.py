@@ -0,0 +1,184 @@
+import logging
+import re
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+# full-text search over posts and comments
+# the engine is picked from the database backend (or settings.TEXT_SEARCH_ENGINE):
+# postgres matches a tsvector expression backed by a functional gin index,
+# sqlite keeps an fts5 table, created after migrate, that posts_app.signals update
+# once every save/delete is committed; a failed update is logged and picked up by
+# the next rebuildtextsearch, it never fails the write itself
+
+logger = logging.getLogger(__name__)
+
+
+def is_postgres():
+    return "postgresql" in settings.DATABASES["default"]["ENGINE"]
+
+
+def text_search_indexes(name):
+    """index declarations for Meta.indexes of a model with a text field"""
+    if not is_postgres():
+        return []
+    from django.contrib.postgres.indexes import GinIndex
+
+    return [GinIndex(PostgresEngine.vector(), name=f"{name}_text_search")]
+
+
+def kind_of(model):
+    return model._meta.model_name
+
+
+def update_on_commit(action, *args):
+    """runs action(*args) of the engine after the current transaction commits"""
+
+    def update():
+        try:
+            action(*args)
+        except Exception:
+            logger.exception("could not update the text search index")
+
+    transaction.on_commit(update)
+
+
+class SearchEngine(ABC):
+    def create_tables(self):
+        """called after migrate"""
+        pass
+
+    def index(self, obj):
+        pass
+
+    def remove(self, model, pk):
+        pass
+
+    def remove_many(self, queryset):
+        """removes the rows of queryset, called before they are deleted"""
+        pass
+
+    def rebuild(self, model, batch_size):
+        return 0
+
+    @abstractmethod
+    def filter(self, queryset, query):
+        """rows of queryset matching query"""
+
+
+class PostgresEngine(SearchEngine):
+    @staticmethod
+    def vector():
+        from django.contrib.postgres.search import SearchVector
+
+        return SearchVector("text", config=settings.TEXT_SEARCH_CONFIG)
+
+    def filter(self, queryset, query):
+        from django.contrib.postgres.search import SearchQuery
+
+        # the annotation matches the indexed expression, so the gin index is used
+        search = SearchQuery(
+            query, config=settings.TEXT_SEARCH_CONFIG, search_type="websearch"
+        )
+        return queryset.annotate(search=self.vector()).filter(search=search)
+
+
+class SQLiteEngine(SearchEngine):
+    table = "text_search"
+    # object_id -> rowid of its fts5 row, the columns of an fts5 table cannot be
+    # indexed, so the rows are found and deleted by rowid through this table
+    rows_table = "text_search_rows"
+
+    def create_tables(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} "
+                "USING fts5(kind UNINDEXED, object_id UNINDEXED, text)"
+            )
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.rows_table} "
+                "(id INTEGER PRIMARY KEY, kind TEXT, object_id TEXT UNIQUE)"
+            )
+
+    def rows_of(self, condition):
+        """subquery of the fts5 rowids of the objects matching condition"""
+        return f"SELECT id FROM {self.rows_table} WHERE {condition}"
+
+    def delete_rows(self, cursor, condition, params):
+        cursor.execute(
+            f"DELETE FROM {self.table} WHERE rowid IN ({self.rows_of(condition)})",
+            params,
+        )
+        cursor.execute(f"DELETE FROM {self.rows_table} WHERE {condition}", params)
+
+    def insert(self, cursor, kind, pk, text):
+        cursor.execute(
+            f"INSERT INTO {self.rows_table} (kind, object_id) VALUES (%s, %s)",
+            [kind, pk.hex],
+        )
+        cursor.execute(
+            f"INSERT INTO {self.table} (rowid, kind, object_id, text) "
+            "VALUES (last_insert_rowid(), %s, %s, %s)",
+            [kind, pk.hex, text],
+        )
+
+    def index(self, obj):
+        with connection.cursor() as cursor:
+            self.delete_rows(cursor, "object_id = %s", [obj.pk.hex])
+            self.insert(cursor, kind_of(obj), obj.pk, obj.text)
+
+    def remove(self, model, pk):
+        with connection.cursor() as cursor:
+            self.delete_rows(cursor, "object_id = %s", [pk.hex])
+
+    def remove_many(self, queryset):
+        sql, params = queryset.values("id").query.sql_with_params()
+        with connection.cursor() as cursor:
+            self.delete_rows(cursor, f"object_id IN ({sql})", params)
+
+    def rebuild(self, model, batch_size):
+        rows = model.objects.values_list("pk", "text").iterator(chunk_size=batch_size)
+        kind, count = kind_of(model), 0
+        with connection.cursor() as cursor:
+            # a full pass, it also drops rows indexed before the rows table existed
+            cursor.execute(f"DELETE FROM {self.table} WHERE kind = %s", [kind])
+            cursor.execute(f"DELETE FROM {self.rows_table} WHERE kind = %s", [kind])
+            for count, (pk, text) in enumerate(rows, start=1):
+                self.insert(cursor, kind, pk, text)
+        return count
+
+    @staticmethod
+    def match_expression(query):
+        # every word is quoted, so user input cannot use the fts5 query syntax
+        return " ".join(f'"{word}"' for word in re.findall(r"\w+", query))
+
+    def filter(self, queryset, query):
+        expression = self.match_expression(query)
+        if not expression:
+            return queryset.none()
+        ids = RawSQL(
+            f"SELECT object_id FROM {self.table} "
+            f"WHERE {self.table} MATCH %s AND kind = %s",
+            [expression, kind_of(queryset.model)],
+        )
+        return queryset.filter(id__in=ids)
+
+
+class ContainsEngine(SearchEngine):
+    """unindexed fallback for other databases"""
+
+    def filter(self, queryset, query):
+        return queryset.filter(text__icontains=query)
+
+
+ENGINES = {"postgresql": PostgresEngine, "sqlite": SQLiteEngine}
+
+
+@lru_cache(maxsize=None)
+def get_engine():
+    if settings.TEXT_SEARCH_ENGINE:
+        return import_string(settings.TEXT_SEARCH_ENGINE)()
+    return ENGINES.get(connection.vendor, ContainsEngine)()
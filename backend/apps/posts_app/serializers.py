@@ -3,14 +3,18 @@ from drf_base64.fields import Base64FileField
 from drf_queryfields.mixins import QueryFieldsMixin
 from drf_spectacular.utils import OpenApiExample, extend_schema_serializer
 from drf_writable_nested.serializers import WritableNestedModelSerializer
+from django.conf import settings
 from rest_framework import serializers
+from social_media_project.derivatives import derivative_urls, image_url
 from rest_framework.generics import get_object_or_404
+from django.db import transaction
+from .attachments import add_attachments
 
 user_representation = {
     "id": "3fa85f64-5717-4562-b3fc-2c963f66afa6",
     "username": "string",
     "full_name": "string",
-    "picture": "example.com/media/profile_pic/32435223-2532.jpg",
+    "picture": "example.com/media/derivatives/9f/9f86d0.../128.webp",
 }
 
 
@@ -20,7 +24,9 @@ class RelatedUser(serializers.RelatedField):
             "id": value.id,
             "username": value.username,
             "full_name": value.full_name,
-            "picture": value.profile_pic.url,
+            "picture": image_url(
+                value.profile_pic, value.profile_pic_digest, max(settings.AVATAR_WIDTHS)
+            ),
         }
         return bostedBy
 
@@ -33,6 +39,26 @@ like_representation = {
 }
 
 
+def liked_by_viewer(serializer, instance, content_type):
+    # annotated on the whole page by with_viewer_state(), looked up otherwise
+    liked = getattr(instance, "liked_by_me", None)
+    request = serializer.context.get("request")
+    if liked is None and request is not None:
+        liked = Like.objects.filter(
+            user=request.user, content_type=content_type, object_id=instance.id
+        ).exists()
+    return liked
+
+
+def save_edited(instance, validated_data):
+    """saves only the edited columns (and modified), the counters are changed
+    with F() by other requests and the values read here may be stale"""
+    for field, value in validated_data.items():
+        setattr(instance, field, value)
+    instance.save(update_fields=[*validated_data, "modified"])
+    return instance
+
+
 @extend_schema_serializer(
     exclude_fields=["user"],
     examples=[
@@ -78,6 +104,7 @@ comment_representation = {
     "text": "string",
     "count_likes": 30,
     "count_replies": 50,
+    "liked_by_me": False,
     "created": "2022-12-13T17:26:25.901Z",
     "modified": "2022-12-13T17:26:25.901Z",
 }
@@ -94,6 +121,7 @@ comment_representation = {
 class CommentSerializer(QueryFieldsMixin, serializers.ModelSerializer):
     user = RelatedUser(read_only=True)
     post = serializers.PrimaryKeyRelatedField(read_only=True)
+    liked_by_me = serializers.SerializerMethodField()
 
     class Meta:
         model = Comment
@@ -105,10 +133,24 @@ class CommentSerializer(QueryFieldsMixin, serializers.ModelSerializer):
             "text",
             "count_likes",
             "count_replies",
+            "liked_by_me",
             "created",
             "modified",
         )
-        read_only_fields = ("id", "user", "post", "parent")
+        read_only_fields = (
+            "id",
+            "user",
+            "post",
+            "parent",
+            "count_likes",
+            "count_replies",
+        )
+
+    def get_liked_by_me(self, instance) -> bool:
+        return liked_by_viewer(self, instance, "comment")
+
+    def update(self, instance, validated_data):
+        return save_edited(instance, validated_data)
 
     @property
     def request(self):
@@ -137,6 +179,23 @@ class CommentSerializer(QueryFieldsMixin, serializers.ModelSerializer):
 class AttachmentSerializer(serializers.ModelSerializer):
 
     file = Base64FileField(required=False)
+    derivatives = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Attachment
+        fields = ("id", "file", "derivatives")
+        read_only_fields = ("id",)
+
+    def get_derivatives(self, instance) -> dict:
+        # resized copies of image files, empty until they are made
+        return derivative_urls(instance.digest, settings.FEED_IMAGE_WIDTHS)
+
+
+class AttachmentUploadSerializer(serializers.ModelSerializer):
+    """attachment sent as a multipart file, the streamed counterpart of
+    AttachmentSerializer"""
+
+    file = serializers.FileField()
 
     class Meta:
         model = Attachment
@@ -150,10 +209,17 @@ post_representation = {
     "text": "3fa85f64-5717-4562-b3fc-2c963f66afa6",
     "count_likes": 30,
     "count_comments": 50,
+    "liked_by_me": True,
     "attachments": [
         {
             "id": "3fa85f64-5717-4562-b3fc-2c963f66afa6",
             "file": "example.com/post_pic/453532-o4f532.jpg",
+            "derivatives": {
+                "720": {
+                    "webp": "example.com/media/derivatives/9f/9f86d0.../720.webp",
+                    "jpeg": "example.com/media/derivatives/9f/9f86d0.../720.jpeg",
+                }
+            },
         }
     ],
     "created": "2022-12-13T17:26:25.901Z",
@@ -175,6 +241,7 @@ post_representation = {
 class PostFeedSerializer(QueryFieldsMixin, WritableNestedModelSerializer):
     user = RelatedUser(read_only=True)
     attachments = AttachmentSerializer(many=True)
+    liked_by_me = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
@@ -184,13 +251,41 @@ class PostFeedSerializer(QueryFieldsMixin, WritableNestedModelSerializer):
             "text",
             "count_likes",
             "count_comments",
+            "liked_by_me",
             "attachments",
             "created",
             "modified",
         ]
-        read_only_fields = ["id", "user"]
+        read_only_fields = ["id", "user", "count_likes", "count_comments"]
+
+    def get_liked_by_me(self, instance) -> bool:
+        return liked_by_viewer(self, instance, "post")
 
+    @transaction.atomic
     def create(self, validated_data):
         validated_data["user"] = self.context["request"].user
+        # added in one statement instead of a nested save (and count) per file
+        attachments = validated_data.pop("attachments", [])
         post = super().create(validated_data)
+        add_attachments(post, [attachment.get("file") for attachment in attachments])
+        return post
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        attachments = validated_data.pop("attachments", None)
+        post = save_edited(instance, validated_data)
+        if attachments is None:
+            return post
+        # like a nested update: listed ids are kept, the other attachments are
+        # deleted and the items without an id are added with add_attachments
+        sent = self.initial_data.get("attachments", [])
+        kept = [item.get("pk") or item.get("id") for item in sent]
+        post.attachments.exclude(id__in=[pk for pk in kept if pk]).delete()
+        added = [
+            attachment.get("file")
+            for attachment, pk in zip(attachments, kept)
+            if not pk
+        ]
+        if added:
+            add_attachments(post, added)
         return post
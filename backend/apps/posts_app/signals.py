@@ -1,9 +1,33 @@
 from django.dispatch import receiver
-from django.db.models.signals import post_delete, post_save, pre_delete
-from .models import Like, Post, Comment
-from .tasks import delete_likes, notifying_post, notifying_like
+from django.db.models.signals import (
+    post_delete,
+    post_migrate,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from .models import Attachment, Like, Post, Comment
+from .tasks import (
+    delete_likes,
+    notifying_post,
+    notifying_like,
+    fan_out_post,
+    make_attachment_derivatives,
+)
 from notifications_app.tasks import delete_notifications
 from django.db import transaction
+from django.db.models import F
+from social_media_project.response_cache import bump_on_commit
+from .search import get_engine, update_on_commit
+
+LIKED_MODELS = {"post": Post, "comment": Comment}
+
+
+def change_count(model, obj_id, field, amount):
+    objects = model.objects.filter(id=obj_id)
+    if amount < 0:
+        objects = objects.filter(**{f"{field}__gte": -amount})
+    objects.update(**{field: F(field) + amount})
 
 
 @receiver(post_delete, sender=Post)
@@ -22,6 +46,12 @@ def notify_posting(sender, instance, created, **kwargs):
         transaction.on_commit(lambda: notifying_post.delay(instance.id))
 
 
+@receiver(post_save, sender=Post)
+def push_to_timelines(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: fan_out_post.delay(instance.id))
+
+
 @receiver(post_delete, sender=Post)
 def delete_post_notifications(sender, instance, **kwargs):
     delete_notifications.delay(instance.id, "post_id")
@@ -50,3 +80,97 @@ def delete_comment_notification(instance, **kwargs):
         search_word = "reply_id"
     search_word = "comment_id"
     delete_notifications.delay(instance.id, search_word)
+
+
+@receiver(post_save, sender=Like)
+def increase_likes_count(created, instance, **kwargs):
+    if created:
+        model = LIKED_MODELS[instance.content_type]
+        change_count(model, instance.object_id, "likes_count", 1)
+
+
+@receiver(post_delete, sender=Like)
+def decrease_likes_count(instance, **kwargs):
+    model = LIKED_MODELS[instance.content_type]
+    change_count(model, instance.object_id, "likes_count", -1)
+
+
+@receiver(post_save, sender=Comment)
+def increase_comments_count(created, instance, **kwargs):
+    if created:
+        change_count(Post, instance.post_id, "comments_count", 1)
+        if instance.parent_id:
+            change_count(Comment, instance.parent_id, "replies_count", 1)
+
+
+@receiver(post_delete, sender=Comment)
+def decrease_comments_count(instance, **kwargs):
+    change_count(Post, instance.post_id, "comments_count", -1)
+    if instance.parent_id:
+        change_count(Comment, instance.parent_id, "replies_count", -1)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post(instance, **kwargs):
+    bump_on_commit(f"post:{instance.id}", f"user-posts:{instance.user.username}")
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment(instance, **kwargs):
+    bump_on_commit(f"post:{instance.post_id}", f"comments:{instance.post_id}")
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+def invalidate_like(instance, **kwargs):
+    bump_on_commit(f"likes:{instance.user_id}")
+    if instance.content_type == "post":
+        bump_on_commit(f"post:{instance.object_id}")
+        return
+    comments = Comment.objects.filter(id=instance.object_id)
+    for post_id in comments.values_list("post_id", flat=True):
+        bump_on_commit(f"comments:{post_id}")
+
+
+@receiver(post_save, sender=Attachment)
+@receiver(post_delete, sender=Attachment)
+def invalidate_attachment(instance, **kwargs):
+    bump_on_commit(f"post:{instance.post_id}")
+
+
+@receiver(pre_save, sender=Attachment)
+def reset_attachment_digest(instance, **kwargs):
+    # a file assigned since the last save is stored by this save
+    if instance.file and not instance.file._committed:
+        instance.digest = ""
+        instance._derive_file = True
+
+
+@receiver(post_save, sender=Attachment)
+def derive_attachment(instance, **kwargs):
+    if getattr(instance, "_derive_file", False):
+        instance._derive_file = False
+        transaction.on_commit(lambda: make_attachment_derivatives.delay(instance.id))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+def index_text(instance, update_fields=None, **kwargs):
+    if update_fields and "text" not in update_fields:
+        return
+    update_on_commit(get_engine().index, instance)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+def unindex_text(sender, instance, **kwargs):
+    # the pk is taken now, delete() clears it before the commit
+    update_on_commit(get_engine().remove, sender, instance.pk)
+
+
+@receiver(post_migrate)
+def create_search_tables(sender, **kwargs):
+    if sender.name == "posts_app":
+        get_engine().create_tables()
@@ -1,7 +1,12 @@
 from celery import shared_task
-from .models import Comment, Like, Post
-from notifications_app.tasks import create_notification
+from django.conf import settings
+from django.core.management import call_command
+from .models import Attachment, Comment, Like, Post
+from notifications_app.tasks import create_notification, notify_followers
 from rest_framework.generics import get_object_or_404
+from social_media_project import derivatives
+from social_media_project.response_cache import bump
+from . import cascade, timeline
 
 
 @shared_task(name="delete_likes")
@@ -13,20 +18,55 @@ def delete_likes(cid, ct):
 from multiprocessing import Pool
 
 
-@shared_task(name="create_post_notifications")
+@shared_task(name="purge_post_tree")
+def purge_post(post_id):
+    return cascade.purge_post(post_id)
+
+
+@shared_task(name="purge_comment_tree")
+def purge_comment(comment_id):
+    return cascade.purge_comment(comment_id)
+
+
+@shared_task(name="reconcile_counters")
+def reconcile_counters():
+    call_command("reconcilecounters")
+    return True
+
+
+@shared_task(name="fan_out_post_to_timelines")
+def fan_out_post(instance_id):
+    post = Post.objects.select_related("user").filter(id=instance_id).first()
+    if post:
+        timeline.fan_out(post)
+
+
+@shared_task(name="backfill_home_timeline")
+def backfill_timeline(follower_id, followee_id):
+    timeline.push_posts([follower_id], timeline.recent_posts(followee_id))
+
+
+@shared_task(name="remove_from_home_timeline")
+def remove_from_timeline(follower_id, followee_id):
+    post_ids = [post_id for post_id, _ in timeline.recent_posts(followee_id)]
+    timeline.remove_posts(follower_id, post_ids)
+
+
+@shared_task(name="remove_post_from_timelines")
+def remove_post_from_timelines(post_id, author_id):
+    timeline.unfan_out(post_id, author_id)
+
+
+# acks_late redelivers the task if the worker dies, it resumes from its checkpoint
+@shared_task(name="create_post_notifications", acks_late=True)
 def notifying_post(instance_id):
-    instance = get_object_or_404(Post, id=instance_id)
-    for follow_relation in instance.user.followers.all():
-        data = {
-            "sender_id": instance.user.id,
-            "receiver_id": follow_relation.from_user.id,
-            "options": {
-                "message": f"user {instance.user.full_name} posted on timeline",
-                "user_username": instance.user.username,
-                "post_id": instance.id,
-            },
-        }
-        create_notification.delay(**data)
+    instance = get_object_or_404(Post.objects.select_related("user"), id=instance_id)
+    options = {
+        "message": f"user {instance.user.full_name} posted on timeline",
+        "user_username": instance.user.username,
+        "post_id": str(instance.id),
+    }
+    notify_followers(instance.user, options, source_id=instance.id)
 
 
 @shared_task(name="create_comment_notifications")
@@ -79,3 +119,17 @@ def notifying_like(instance_id, provider):
         "options": options,
     }
     create_notification.delay(**data)
+
+
+@shared_task(name="make_attachment_derivatives")
+def make_attachment_derivatives(attachment_id):
+    attachment = Attachment.objects.filter(id=attachment_id).first()
+    if attachment is None or not attachment.file:
+        return None
+    digest = derivatives.make_derivatives(
+        attachment.file, settings.FEED_IMAGE_WIDTHS
+    )
+    if digest:
+        Attachment.objects.filter(id=attachment_id).update(digest=digest)
+        bump(f"post:{attachment.post_id}")
+    return digest
@@ -1 +1,369 @@
-from django.test import TestCase
+import tempfile
+from contextlib import contextmanager
+from io import BytesIO
+from unittest import skipUnless
+from unittest.mock import patch
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection
+from django.db.models.signals import post_delete
+from django.test import TestCase, override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+from social_media_project import derivatives
+from social_media_project.pagination import KeysetPagination
+from social_media_project.querysets import raw_delete
+from rest_framework.exceptions import ValidationError
+from users_app.models import Follow
+from . import cascade, timeline
+from .attachments import add_attachments
+from .models import Attachment, Comment, Like, Post
+from .search import get_engine
+from .serializers import PostFeedSerializer
+from .views import AttachmentsView
+
+User = get_user_model()
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username,
+        email=f"{username}@gmail.com",
+        password="password",
+        first_name="first_name",
+        last_name="last_name",
+    )
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        self.user = create_user("user_name")
+        self.posts = [
+            Post.objects.create(user=self.user, text=str(i)) for i in range(25)
+        ]
+
+    def paginate(self, url):
+        request = Request(APIRequestFactory().get(url))
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(Post.objects.all(), request)
+        return page, paginator.get_next_link()
+
+    def test_pages_cover_all_rows_once(self):
+        seen = []
+        url = "/posts/?page_size=10"
+        while url:
+            page, url = self.paginate(url)
+            seen.extend(post.id for post in page)
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(set(seen), {post.id for post in self.posts})
+
+    def test_new_rows_do_not_shift_pages(self):
+        first_page, next_url = self.paginate("/posts/?page_size=10")
+        Post.objects.create(user=self.user, text="new post")
+        second_page, _ = self.paginate(next_url)
+        self.assertEqual(len(second_page), 10)
+        self.assertTrue({p.id for p in first_page}.isdisjoint(p.id for p in second_page))
+
+    def test_page_size_is_bounded(self):
+        request = Request(APIRequestFactory().get("/posts/?page_size=100000"))
+        paginator = KeysetPagination()
+        self.assertEqual(paginator.get_page_size(request), paginator.max_page_size)
+
+
+class CountersTest(TestCase):
+    def setUp(self):
+        self.user = create_user("user_name")
+        self.post = Post.objects.create(user=self.user, text="post")
+
+    def test_likes_count(self):
+        Like.objects.create(user=self.user, content_type="post", object_id=self.post.id)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.count_likes, 1)
+
+    def test_comments_and_replies_count(self):
+        comment = Comment.objects.create(user=self.user, post=self.post, text="c")
+        Comment.objects.create(user=self.user, post=self.post, parent=comment, text="r")
+        self.post.refresh_from_db()
+        comment.refresh_from_db()
+        self.assertEqual(self.post.count_comments, 2)
+        self.assertEqual(comment.count_replies, 1)
+
+    def test_edit_keeps_concurrent_counts(self):
+        stale = Post.objects.get(id=self.post.id)
+        Like.objects.create(user=self.user, content_type="post", object_id=self.post.id)
+        serializer = PostFeedSerializer(stale, data={"text": "edited"}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.text, self.post.count_likes), ("edited", 1))
+
+
+class FeedQueriesTest(TestCase):
+    def setUp(self):
+        users = [create_user(f"user_name{i}") for i in range(3)]
+        for i in range(30):
+            post = Post.objects.create(user=users[i % 3], text=str(i))
+            Attachment.objects.create(post=post)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        for page_size in (5, 30):
+            posts = Post.objects.for_feed()[:page_size]
+            # posts with their users + attachments
+            with self.assertNumQueries(2):
+                data = PostFeedSerializer(posts, many=True).data
+            self.assertEqual(len(data), page_size)
+
+
+class TextSearchTest(TestCase):
+    def setUp(self):
+        self.user = create_user("user_name")
+        with self.index_updates():
+            self.post = Post.objects.create(user=self.user, text="cats are great")
+            Post.objects.create(user=self.user, text="dogs are fine")
+
+    @contextmanager
+    def index_updates(self):
+        """runs the index updates of the block as if it committed, the other
+        callbacks queue celery tasks"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            yield
+        for callback in callbacks:
+            if callback.__qualname__ == "update_on_commit.<locals>.update":
+                callback()
+
+    def search(self, queryset, query):
+        return list(get_engine().filter(queryset, query))
+
+    def test_matches_posts_and_comments(self):
+        with self.index_updates():
+            comment = Comment.objects.create(
+                user=self.user, post=self.post, text="cats"
+            )
+        self.assertEqual(self.search(Post.objects.all(), "cats"), [self.post])
+        self.assertEqual(self.search(Comment.objects.all(), "cats"), [comment])
+
+    def test_index_follows_updates(self):
+        self.post.text = "birds"
+        with self.index_updates():
+            self.post.save()
+        self.assertEqual(self.search(Post.objects.all(), "cats"), [])
+        self.assertEqual(self.search(Post.objects.all(), "birds"), [self.post])
+
+    @skipUnless(connection.vendor == "sqlite", "rows of the sqlite fts5 table")
+    def test_rows_are_replaced_and_removed_by_id(self):
+        engine = get_engine()
+        engine.index(self.post)
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {engine.table}")
+            self.assertEqual(cursor.fetchone()[0], 2)
+        engine.remove(Post, self.post.pk)
+        self.assertEqual(self.search(Post.objects.all(), "cats"), [])
+        self.assertEqual(len(self.search(Post.objects.all(), "dogs")), 1)
+
+    def test_index_failure_is_logged(self):
+        with patch.object(get_engine(), "index", side_effect=DatabaseError):
+            with self.assertLogs("posts_app.search", "ERROR"):
+                with self.index_updates():
+                    Post.objects.create(user=self.user, text="cats again")
+        self.assertTrue(Post.objects.filter(text="cats again").exists())
+
+
+class CascadeTest(TestCase):
+    def setUp(self):
+        self.user = create_user("user_name")
+        self.post = Post.objects.create(user=self.user, text="post")
+        self.comment = Comment.objects.create(user=self.user, post=self.post, text="c")
+        self.reply = Comment.objects.create(
+            user=self.user, post=self.post, parent=self.comment, text="r"
+        )
+        Like.objects.create(user=self.user, content_type="post", object_id=self.post.id)
+        Like.objects.create(
+            user=self.user, content_type="comment", object_id=self.reply.id
+        )
+
+    def test_purge_post(self):
+        cascade.purge_post(self.post.id)
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(Like.objects.exists())
+
+    def test_raw_delete_skips_the_collector(self):
+        # raw_delete relies on the private QuerySet._raw_delete
+        deleted = []
+
+        def receiver(sender, **kwargs):
+            deleted.append(sender)
+
+        post_delete.connect(receiver, sender=Like)
+        try:
+            count = raw_delete(Like.objects.filter(content_type="post"))
+        finally:
+            post_delete.disconnect(receiver, sender=Like)
+        self.assertEqual((count, deleted), (1, []))
+        self.assertEqual(Like.objects.get().object_id, self.reply.id)
+
+    def test_purge_comment_updates_counters(self):
+        other = Comment.objects.create(user=self.user, post=self.post, text="o")
+        cascade.purge_comment(self.comment.id)
+        self.post.refresh_from_db()
+        self.assertEqual(list(Comment.objects.all()), [other])
+        self.assertEqual(Like.objects.get().object_id, self.post.id)
+        self.assertEqual(self.post.count_comments, 1)
+
+
+class HomeTimelineTest(TestCase):
+    def setUp(self):
+        self.user = create_user("user_name")
+        posts = [Post.objects.create(user=self.user, text=str(i)) for i in range(4)]
+        # newest first, like the redis timeline
+        self.entries = [(str(post.id), post.created) for post in reversed(posts)]
+        self.posts = list(reversed(posts))
+
+    def read(self, user, before=None, limit=None):
+        page = self.entries[:limit]
+        oldest = page[-1][1] if len(page) >= limit else None
+        return [post_id for post_id, _ in page], oldest
+
+    def home_posts(self, limit):
+        no_celebrities = Follow.objects.none().values("to_user")
+        with patch.object(timeline, "read", self.read), patch.object(
+            timeline, "followed_celebrities", lambda user: no_celebrities
+        ):
+            posts = timeline.filter_home_posts(
+                Post.objects.all(), self.user, limit=limit
+            )
+            return list(posts[:limit])
+
+    def test_purged_post_does_not_end_the_page(self):
+        # still in the timeline, the window is widened past it
+        cascade.purge_post(self.posts[0].id)
+        self.assertEqual(self.home_posts(3), self.posts[1:4])
+
+
+class ViewerLikesTest(TestCase):
+    def setUp(self):
+        self.user = create_user("user_name")
+        self.posts = [Post.objects.create(user=self.user, text=str(i)) for i in range(5)]
+        for post in self.posts[:2]:
+            Like.objects.create(user=self.user, content_type="post", object_id=post.id)
+
+    def test_with_viewer_state(self):
+        posts = Post.objects.with_viewer_state(self.user).order_by("created")
+        self.assertEqual(
+            [post.liked_by_me for post in posts], [True, True, False, False, False]
+        )
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), ATTACHMENT_MAX_SIZE=1024)
+class AttachmentUploadTest(TestCase):
+    def setUp(self):
+        self.user = create_user("user_name")
+        self.post = Post.objects.create(user=self.user, text="post")
+
+    def upload(self, *files, user=None):
+        request = APIRequestFactory().post(
+            f"/posts/{self.post.id}/attachments",
+            {"file": list(files)},
+            format="multipart",
+        )
+        force_authenticate(request, user=user or self.user)
+        return AttachmentsView.as_view()(request, post_id=str(self.post.id))
+
+    def test_upload_files(self):
+        response = self.upload(
+            SimpleUploadedFile("a.txt", b"a" * 1024),
+            SimpleUploadedFile("b.txt", b"b" * 10),
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.post.attachments.count(), 2)
+
+    def test_too_large_file_is_refused(self):
+        response = self.upload(SimpleUploadedFile("a.txt", b"a" * 1025))
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Attachment.objects.exists())
+
+    def test_files_limit(self):
+        self.upload(SimpleUploadedFile("a.txt", b"a"))
+        response = self.upload(
+            SimpleUploadedFile("b.txt", b"b"), SimpleUploadedFile("c.txt", b"c")
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.post.attachments.count(), 1)
+
+    def test_files_keep_their_order(self):
+        files = [SimpleUploadedFile(f"{name}.txt", b"a") for name in "ab"]
+        attachments = add_attachments(self.post, files[:1])
+        attachments += add_attachments(self.post, files[1:])
+        self.assertEqual(
+            list(self.post.get_attachment_order()), [a.pk for a in attachments]
+        )
+
+    def test_bulk_limit(self):
+        files = [SimpleUploadedFile(f"{name}.txt", b"a") for name in "abc"]
+        with self.assertRaises(ValidationError):
+            add_attachments(self.post, files)
+        self.assertFalse(Attachment.objects.exists())
+
+    def test_update_adds_files_in_bulk(self):
+        kept = Attachment.objects.create(post=self.post)
+        Attachment.objects.create(post=self.post)
+        data = {"attachments": [{"id": str(kept.id)}, {}]}
+        serializer = PostFeedSerializer(self.post, data=data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        order = list(self.post.get_attachment_order())
+        self.assertEqual((len(order), order[0]), (2, kept.pk))
+
+    def test_update_keeps_the_limit(self):
+        kept = Attachment.objects.create(post=self.post)
+        data = {"attachments": [{"id": str(kept.id)}, {}, {}]}
+        serializer = PostFeedSerializer(self.post, data=data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        with self.assertRaises(ValidationError):
+            serializer.save()
+        self.assertEqual(list(self.post.attachments.all()), [kept])
+
+    def test_only_owner_uploads(self):
+        other = create_user("other_user")
+        response = self.upload(SimpleUploadedFile("a.txt", b"a"), user=other)
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class DerivativesTest(TestCase):
+    def setUp(self):
+        self.post = Post.objects.create(user=create_user("user_name"), text="post")
+
+    def attach_image(self, size):
+        buffer = BytesIO()
+        Image.new("RGB", size, "red").save(buffer, "PNG")
+        image = SimpleUploadedFile("image.png", buffer.getvalue())
+        return Attachment.objects.create(post=self.post, file=image)
+
+    def test_copies_are_resized_and_shared(self):
+        first = self.attach_image((1440, 960))
+        digest = derivatives.make_derivatives(first.file, [720])
+        name = derivatives.derivative_name(digest, 720, "webp")
+        with default_storage.open(name) as file:
+            self.assertEqual(Image.open(file).size, (720, 480))
+        second = self.attach_image((1440, 960))
+        self.assertEqual(derivatives.make_derivatives(second.file, [720]), digest)
+        self.assertEqual(
+            set(derivatives.derivative_urls(digest, [720])["720"]), {"webp", "jpeg"}
+        )
+
+    def test_avatars_are_square_and_never_upscaled(self):
+        attachment = self.attach_image((300, 100))
+        digest = derivatives.make_derivatives(attachment.file, [64], square=True)
+        with default_storage.open(derivatives.derivative_name(digest, 64, "jpeg")) as f:
+            self.assertEqual(Image.open(f).size, (64, 64))
+        small = derivatives.resize(Image.new("RGB", (300, 100)), 720, square=False)
+        self.assertEqual(small.size, (300, 100))
+
+    def test_other_files_are_skipped(self):
+        attachment = Attachment.objects.create(
+            post=self.post, file=SimpleUploadedFile("notes.txt", b"notes")
+        )
+        self.assertIsNone(derivatives.make_derivatives(attachment.file, [720]))
@@ -0,0 +1,208 @@
+from datetime import datetime, timezone
+from itertools import chain, islice
+from django.conf import settings
+from django.db.models import Q
+from django_redis import get_redis_connection
+from social_media_project.response_cache import bump
+from users_app.models import Follow
+from .models import Post
+
+# materialized home timelines (fan-out-on-write)
+# every user has a capped redis sorted set of post ids scored by creation time,
+# accounts with many followers (celebrities) are not fanned out, their posts
+# are merged in at read time instead
+
+TIMELINE_KEY = "timeline:{}"
+CELEBRITIES_KEY = "timeline:celebrities"
+# response cache resource of the posts of one celebrity
+CELEBRITY_POSTS = "celebrity-posts:{}"
+# keeps an empty timeline alive so it is not rebuilt on every read
+SENTINEL = "-"
+
+
+def _connection():
+    return get_redis_connection("default")
+
+
+def timeline_key(user_id):
+    return TIMELINE_KEY.format(user_id)
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _score(created):
+    return created.timestamp()
+
+
+def push_posts(user_ids, posts):
+    """adds (post_id, created) pairs to the timelines of user_ids and trims them,
+    timelines that are not materialized yet are skipped because they are rebuilt
+    from the database on the first read"""
+    mapping = {str(post_id): _score(created) for post_id, created in posts}
+    if not mapping or not user_ids:
+        return
+    conn = _connection()
+    keys = [timeline_key(user_id) for user_id in user_ids]
+    pipe = conn.pipeline(transaction=False)
+    for key in keys:
+        pipe.exists(key)
+    keys = [key for key, exists in zip(keys, pipe.execute()) if exists]
+    pipe = conn.pipeline(transaction=False)
+    for key in keys:
+        pipe.zadd(key, mapping)
+        pipe.zremrangebyrank(key, 0, -settings.TIMELINE_MAX_LENGTH - 1)
+    pipe.execute()
+    bump(*keys)
+
+
+def remove_posts(user_id, post_ids):
+    post_ids = [str(post_id) for post_id in post_ids]
+    if post_ids:
+        _connection().zrem(timeline_key(user_id), *post_ids)
+        bump(timeline_key(user_id))
+
+
+def is_celebrity(followers_count):
+    return followers_count >= settings.TIMELINE_CELEBRITY_THRESHOLD
+
+
+def update_celebrity(user_id, followers_count):
+    conn = _connection()
+    if is_celebrity(followers_count):
+        conn.sadd(CELEBRITIES_KEY, str(user_id))
+        return True
+    conn.srem(CELEBRITIES_KEY, str(user_id))
+    return False
+
+
+def fan_out(post):
+    # authors always see their own posts
+    push_posts([post.user_id], [(post.id, post.created)])
+    followers = Follow.objects.filter(to_user_id=post.user_id)
+    if update_celebrity(post.user_id, post.user.followers_count):
+        # only the home feeds of this celebrity's followers get stale
+        bump(CELEBRITY_POSTS.format(post.user_id))
+        return  # merged into followers' home at read time
+    follower_ids = followers.values_list("from_user_id", flat=True).iterator(
+        chunk_size=settings.TIMELINE_FANOUT_BATCH_SIZE
+    )
+    for batch in _batches(follower_ids, settings.TIMELINE_FANOUT_BATCH_SIZE):
+        push_posts(batch, [(post.id, post.created)])
+
+
+def unfan_out(post_id, author_id):
+    """removes a deleted post from the timelines of its author and followers,
+    celebrities included since rebuilt and backfilled timelines hold their posts"""
+    conn = _connection()
+    followers = Follow.objects.filter(to_user_id=author_id)
+    follower_ids = followers.values_list("from_user_id", flat=True).iterator(
+        chunk_size=settings.TIMELINE_FANOUT_BATCH_SIZE
+    )
+    user_ids = chain([author_id], follower_ids)
+    for batch in _batches(user_ids, settings.TIMELINE_FANOUT_BATCH_SIZE):
+        keys = [timeline_key(user_id) for user_id in batch]
+        pipe = conn.pipeline(transaction=False)
+        for key in keys:
+            pipe.zrem(key, str(post_id))
+        removed = [key for key, count in zip(keys, pipe.execute()) if count]
+        if removed:
+            bump(*removed)
+
+
+def recent_posts(user_id):
+    posts = Post.objects.filter(user_id=user_id).order_by("-created")
+    return posts.values_list("id", "created")[: settings.TIMELINE_MAX_LENGTH]
+
+
+def rebuild(user):
+    followings = Follow.objects.filter(from_user=user).values("to_user")
+    posts = (
+        Post.objects.filter(Q(user=user) | Q(user__in=followings))
+        .order_by("-created")
+        .values_list("id", "created")[: settings.TIMELINE_MAX_LENGTH]
+    )
+    mapping = {str(post_id): _score(created) for post_id, created in posts}
+    mapping[SENTINEL] = 0
+    key = timeline_key(user.id)
+    pipe = _connection().pipeline()
+    pipe.delete(key)
+    pipe.zadd(key, mapping)
+    pipe.expire(key, settings.TIMELINE_TTL)
+    pipe.execute()
+
+
+def read(user, before=None, limit=None):
+    """returns the ids of the newest limit posts of the user's home timeline
+    created before the datetime before (the page cursor), plus the posts created
+    at the same time as before (the keyset sorts them out), and the creation time
+    of the oldest returned post when the limit is reached"""
+    conn = _connection()
+    key = timeline_key(user.id)
+    if not conn.exists(key):
+        rebuild(user)
+    top = "+inf" if before is None else f"({_score(before)}"
+    pipe = conn.pipeline(transaction=False)
+    window = {"start": 0, "num": limit} if limit is not None else {}
+    pipe.zrevrangebyscore(key, top, "-inf", withscores=True, **window)
+    if before is not None:
+        pipe.zrevrangebyscore(key, _score(before), _score(before), withscores=True)
+    pipe.expire(key, settings.TIMELINE_TTL)
+    page, *ties = pipe.execute()[:-1]
+    oldest = None
+    if limit is not None and len(page) >= limit:
+        oldest = datetime.fromtimestamp(page[-1][1], tz=timezone.utc)
+    post_ids = [
+        post_id.decode()
+        for post_id, _ in page + (ties[0] if ties else [])
+        if post_id != SENTINEL.encode()
+    ]
+    return post_ids, oldest
+
+
+def followed_celebrities(user, celebrities=None):
+    """ids of the celebrities user follows (a subquery), among the given
+    celebrity ids or all the current ones"""
+    if celebrities is None:
+        members = _connection().smembers(CELEBRITIES_KEY)
+        celebrities = [member.decode() for member in members]
+    return Follow.objects.filter(from_user=user, to_user__in=celebrities).values(
+        "to_user"
+    )
+
+
+def home_cache_resources(user):
+    """response cache resources of the user's home feed"""
+    celebrities = followed_celebrities(user).order_by("to_user")
+    return [timeline_key(user.id)] + [
+        CELEBRITY_POSTS.format(celebrity_id)
+        for celebrity_id in celebrities.values_list("to_user", flat=True)
+    ]
+
+
+def home_window(queryset, post_ids, celebrities, oldest=None):
+    """posts of queryset in a window of the home feed: the timeline's post_ids
+    and the posts of the celebrities subquery created since oldest"""
+    celebrity_posts = Q(user__in=celebrities)
+    if oldest is not None:
+        # older ones come after the oldest timeline post of the window
+        celebrity_posts &= Q(created__gte=oldest)
+    return queryset.filter(Q(id__in=post_ids) | celebrity_posts)
+
+
+def filter_home_posts(queryset, user, before=None, limit=None, condition=Q()):
+    """home posts of one page: its slice of the materialized timeline merged with
+    the posts of the followed celebrities in the same time window; the slice is
+    widened until limit of its posts pass the filters of queryset and condition
+    (blocked authors, deleted posts, the page cursor) or the timeline ends"""
+    celebrities = followed_celebrities(user)
+    window = limit
+    while True:
+        post_ids, oldest = read(user, before, window)
+        posts = home_window(queryset, post_ids, celebrities, oldest)
+        if oldest is None or posts.filter(condition)[:limit].count() >= limit:
+            return posts.order_by("-created")
+        window *= 2
@@ -2,16 +2,24 @@ from django.urls import path
 from .views import (
     PostsView,
     PostDetailView,
+    AttachmentsView,
     ModifyComment,
     CommentPostView,
     LikeView,
+    SearchView,
 )
 from rest_framework.urlpatterns import format_suffix_patterns
 
 urlpatterns = [
     path("", PostsView.as_view(), name="posts"),
     path("likes-objects", LikeView.as_view(), name="like-post_comment_reply"),
+    path("search", SearchView.as_view(), name="search-posts"),
     path("<str:post_id>", PostDetailView.as_view(), name="post-detail"),
+    path(
+        "<str:post_id>/attachments",
+        AttachmentsView.as_view(),
+        name="upload-attachments",
+    ),
     path(
         "<str:post_id>/comments",
         CommentPostView.as_view(),
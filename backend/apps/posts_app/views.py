@@ -1,15 +1,44 @@
-from urllib import request
 from .serializers import *
 from rest_framework.generics import (
+    CreateAPIView,
     RetrieveUpdateDestroyAPIView,
+    ListAPIView,
     ListCreateAPIView,
     DestroyAPIView,
     get_object_or_404,
 )
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
 from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from social_media_project.response_cache import cached_response
+from social_media_project.uploads import StreamedUploadMixin
+from users_app.models import Block
+from . import timeline
+from .attachments import add_attachments
+from .search import get_engine
+from .tasks import purge_comment, purge_post
+
+
+class HideBlockedMixin:
+    """leaves out rows written by users who blocked the viewer or who the viewer
+    blocked"""
+
+    def get_queryset(self):
+        blocked_ids = Block.blocked_ids(self.request.user)
+        return super().get_queryset().exclude(user_id__in=blocked_ids)
+
+
+class ViewerStateMixin:
+    """annotates whether the viewer liked every post or comment of the page"""
+
+    def get_queryset(self):
+        return super().get_queryset().with_viewer_state(self.request.user)
 
 
 @extend_schema_view(
@@ -35,26 +64,26 @@ from django.contrib.auth import get_user_model
         operation_id="Create Post", description="Create a Post", tags=["posts"]
     ),
 )
-class PostsView(ListCreateAPIView):
+class PostsView(ViewerStateMixin, HideBlockedMixin, ListCreateAPIView):
 
     serializer_class = PostFeedSerializer
-    queryset = Post.objects.all()
+    queryset = Post.objects.for_feed()
     http_method_names = ["get", "post"]
 
-    @property
-    def followings_users(self):
-        follwings = self.request.user.followings.all()
-        user_followings = [
-            followeing_relation.to_user for followeing_relation in follwings
-        ]
-        user_followings.append(self.request.user)
-        return user_followings
-
     def home_queryset(self, queryset):
-        home_posts = queryset.filter(user__in=self.followings_users)
+        # only the slice of the timeline the page needs is read
+        cursor = self.paginator.decode_cursor(self.request, Post)
+        before, after_cursor = None, Q()
+        if cursor:
+            before, after_cursor = cursor[0], self.paginator.keyset_condition(cursor)
+        # one more than the page, so the paginator can tell there is a next page
+        limit = self.paginator.get_page_size(self.request) + 1
+        home_posts = timeline.filter_home_posts(
+            queryset, self.request.user, before, limit, after_cursor
+        )
         return home_posts
 
-    @property
+    @cached_property
     def specific_user(self):
         User = get_user_model()
         username = self.request.GET.get("username", "")
@@ -68,21 +97,27 @@ class PostsView(ListCreateAPIView):
         return queryset.filter(user=self.specific_user)
 
     def filter_queryset(self, queryset):
-        posts = self.home_queryset(queryset)
+        # the timeline is only read for the home feed
         if self.specific_user:
-            posts = self.user_post_queryset(queryset)
-        return posts
+            return self.user_post_queryset(queryset)
+        return self.home_queryset(queryset)
 
     def check_user_blocked(self, user):
-        if user in self.request.user.blockings.all():
-            return self.permission_denied(request, message="you blocked this user")
-
-    @method_decorator(
-        decorator=cache_page(
-            timeout=60 * 60 * 24, cache="default", key_prefix="get-posts"
-        ),
-        name="get_posts",
-    )
+        if str(user.id) in Block.blocked_ids(self.request.user):
+            return self.permission_denied(self.request, message="you blocked this user")
+
+    def get_cache_resources(self):
+        viewer = self.request.user.pk
+        username = self.request.GET.get("username", "")
+        if username:
+            return [f"user-posts:{username}", f"blocks:{viewer}", f"likes:{viewer}"]
+        return [
+            *timeline.home_cache_resources(self.request.user),
+            f"blocks:{viewer}",
+            f"likes:{viewer}",
+        ]
+
+    @cached_response(timeout=settings.FEED_CACHE_TIMEOUT)
     def get(self, request, *args, **kwargs):
         if self.specific_user:
             self.check_user_blocked(self.specific_user)
@@ -124,18 +159,24 @@ class RetrieveUpdateDestroy(RetrieveUpdateDestroyAPIView):
         operation_id="Delete Post", description="Delete a Post", tags=["post"]
     ),
 )
-class PostDetailView(RetrieveUpdateDestroy):
+class PostDetailView(ViewerStateMixin, HideBlockedMixin, RetrieveUpdateDestroy):
     serializer_class = PostFeedSerializer
-    queryset = Post.objects.all()
+    queryset = Post.objects.for_feed()
 
     # instead of passing lookup field in url and make all changes on it
     def get_object(self):
         pid = self.request.resolver_match.kwargs.get("post_id")
-        return get_object_or_404(Post, pk=pid)
+        return get_object_or_404(self.get_queryset(), pk=pid)
+
+    def get_cache_resources(self):
+        viewer = self.request.user.pk
+        return [
+            f"post:{self.kwargs.get('post_id')}",
+            f"blocks:{viewer}",
+            f"likes:{viewer}",
+        ]
 
-    @method_decorator(
-        cache_page(timeout=60 * 60 * 24, key_prefix="get-post-by-id"), name="get_post"
-    )
+    @cached_response()
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
@@ -145,7 +186,48 @@ class PostDetailView(RetrieveUpdateDestroy):
 
     def delete(self, request, *args, **kwargs):
         self.check_user_permissions()
-        return super().delete(request, *args, **kwargs)
+        # comments, likes and notifications are purged in one background job
+        post_id = self.get_object().id
+        transaction.on_commit(lambda: purge_post.delay(post_id))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@extend_schema_view(
+    post=extend_schema(
+        operation_id="Upload Attachments",
+        description="streams one or two files (multipart, field 'file') to a post of the user, \
+            bigger files than the upload limit are refused with 413",
+        tags=["post"],
+    ),
+)
+class AttachmentsView(StreamedUploadMixin, CreateAPIView):
+    serializer_class = AttachmentUploadSerializer
+    max_upload_files = Attachment.MAX_PER_POST
+
+    def get_max_upload_size(self):
+        return settings.ATTACHMENT_MAX_SIZE
+
+    def get_object(self):
+        post = get_object_or_404(Post, pk=self.kwargs.get("post_id"))
+        if post.user != self.request.user:
+            self.permission_denied(self.request)
+        return post
+
+    def create(self, request, *args, **kwargs):
+        # the owner is checked before the body is read
+        post = self.get_object()
+        serializers = [
+            self.get_serializer(data={"file": file})
+            for file in request.FILES.getlist("file")
+        ]
+        if not serializers:
+            raise ValidationError({"file": "no file was uploaded"})
+        for serializer in serializers:
+            serializer.is_valid(raise_exception=True)
+        files = [serializer.validated_data["file"] for serializer in serializers]
+        attachments = add_attachments(post, files)
+        data = self.get_serializer(attachments, many=True).data
+        return Response(data, status=status.HTTP_201_CREATED)
 
 
 @extend_schema_view(
@@ -200,10 +282,10 @@ class PostDetailView(RetrieveUpdateDestroy):
         ],
     ),
 )
-class LikeView(ListCreateAPIView, DestroyAPIView):
+class LikeView(HideBlockedMixin, ListCreateAPIView, DestroyAPIView):
 
     serializer_class = LikeSerializer
-    queryset = Like.objects.all()
+    queryset = Like.objects.select_related("user")
     http_method_names = ["get", "post", "delete"]
 
     @property
@@ -222,33 +304,27 @@ class LikeView(ListCreateAPIView, DestroyAPIView):
         return rid
 
     def get_object(self):
-
+        # the viewer's own like of the object
+        likes = Like.objects.filter(user=self.request.user)
         if self.get_post_id:
-            return get_object_or_404(
-                Like, object_id=self.get_post_id, content_type="post"
-            )
+            return get_object_or_404(likes.of("post", self.get_post_id))
         elif self.get_comment_id:
-            return get_object_or_404(
-                Like, content_type="comment", object_id=self.get_comment_id
-            )
+            return get_object_or_404(likes.of("comment", self.get_comment_id))
         elif self.get_reply_id:
-            return get_object_or_404(
-                Like, content_type="comment", object_id=self.get_reply_id
-            )
+            return get_object_or_404(likes.of("comment", self.get_reply_id))
 
     def filter_queryset(self, queryset):
         if self.get_post_id:
-            return queryset.filter(object_id=self.get_post_id, content_type="post")
+            return queryset.of("post", self.get_post_id)
         elif self.get_comment_id:
-            return queryset.filter(
-                content_type="comment", object_id=self.get_comment_id
-            )
+            return queryset.of("comment", self.get_comment_id)
         elif self.get_reply_id:
-            return queryset.filter(content_type="comment", object_id=self.get_reply_id)
+            return queryset.of("comment", self.get_reply_id)
+        return queryset.none()
 
     def check_delete_permissions(self, obj):
         if self.request.user != obj.user:
-            return self.permission_denied(request)
+            return self.permission_denied(self.request)
 
     def delete(self, request, **kwargs):
         self.check_delete_permissions(self.get_object())
@@ -281,9 +357,9 @@ class LikeView(ListCreateAPIView, DestroyAPIView):
         ],
     ),
 )
-class CommentPostView(ListCreateAPIView):
+class CommentPostView(ViewerStateMixin, HideBlockedMixin, ListCreateAPIView):
     serializer_class = CommentSerializer
-    queryset = Comment.objects.all()
+    queryset = Comment.objects.for_feed()
     http_method_names = ["get", "post"]
 
     @property
@@ -305,9 +381,15 @@ class CommentPostView(ListCreateAPIView):
             return queryset.filter(parent=obj)
         return queryset.filter(post=obj, parent=None)
 
-    @method_decorator(
-        cache_page(timeout=60 * 60 * 24, key_prefix="get-comments"), name="get_commetns"
-    )
+    def get_cache_resources(self):
+        viewer = self.request.user.pk
+        return [
+            f"comments:{self.kwargs.get('post_id')}",
+            f"blocks:{viewer}",
+            f"likes:{viewer}",
+        ]
+
+    @cached_response()
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
@@ -329,14 +411,14 @@ class CommentPostView(ListCreateAPIView):
         tags=["comment or reply"],
     ),
 )
-class ModifyComment(RetrieveUpdateDestroy):
+class ModifyComment(ViewerStateMixin, HideBlockedMixin, RetrieveUpdateDestroy):
     serializer_class = CommentSerializer
-    queryset = Comment.objects.all()
+    queryset = Comment.objects.for_feed()
     http_method_names = ["get", "patch", "delete"]
 
     def get_object(self):
         obj_id = self.request.resolver_match.kwargs.get("comment_or_reply_id")
-        obj = get_object_or_404(Comment, id=obj_id)
+        obj = get_object_or_404(self.get_queryset(), id=obj_id)
         return obj
 
     def check_delete_permissions(self):
@@ -345,9 +427,53 @@ class ModifyComment(RetrieveUpdateDestroy):
         return self.check_user_permissions(permissions_plus)
 
     def delete(self, request, **kwargs):
-        self.check_delete_permissions(request)
-        return super().delete(request)
+        self.check_delete_permissions()
+        comment_id = self.get_object().id
+        transaction.on_commit(lambda: purge_comment.delay(comment_id))
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
     def patch(self, request, **kwargs):
         self.check_user_permissions()
         return super().patch(request)
+
+
+@extend_schema_view(
+    get=extend_schema(
+        operation_id="search posts or comments",
+        description="full-text search over posts (default) or comments and replies, newest first",
+        tags=["posts"],
+        parameters=[
+            OpenApiParameter(name="q", description="words to search for", type=str),
+            OpenApiParameter(
+                name="type",
+                description="what to search",
+                type=str,
+                enum=["post", "comment"],
+            ),
+        ],
+    ),
+)
+class SearchView(ViewerStateMixin, HideBlockedMixin, ListAPIView):
+    http_method_names = ["get"]
+
+    @property
+    def search_type(self):
+        return self.request.GET.get("type", "post")
+
+    def get_queryset(self):
+        if self.search_type == "comment":
+            self.queryset = Comment.objects.for_feed()
+        else:
+            self.queryset = Post.objects.for_feed()
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        if self.search_type == "comment":
+            return CommentSerializer
+        return PostFeedSerializer
+
+    def filter_queryset(self, queryset):
+        query = self.request.GET.get("q", "").strip()
+        if not query:
+            return queryset.none()
+        return get_engine().filter(queryset, query)
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from users_app import search
+
+
+class Command(BaseCommand):
+    """django command to rebuild the username prefix search index in redis"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        count = search.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"indexed {count} users"))
@@ -1,9 +1,11 @@
 from django.db import models
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Q
+from django.core.cache import cache
 from django.contrib.auth.models import AbstractUser
 from .validators import username_validator, name_validator
 from django.utils.translation import gettext_lazy as _
 from posts_app.path_generation import PathAndRename, uuid4
+from media_app.storage import uploads_storage
 from rest_framework.exceptions import ValidationError
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode
@@ -49,11 +51,14 @@ class User(AbstractUser):
     )
     profile_pic = models.ImageField(
         upload_to=PathAndRename("profile_pic/"),
+        storage=uploads_storage,
         blank=True,
         null=True,
         verbose_name="profile picture",
         default="default-image.jpg",
     )
+    # sha256 of the picture once its resized copies are made
+    profile_pic_digest = models.CharField(max_length=64, blank=True, editable=False)
     birth_date = models.DateField(null=True, blank=True)
     CHOICES = [("undefined", "-----"), ("male", "male"), ("female", "female")]
     gender = models.CharField(
@@ -82,6 +87,11 @@ class User(AbstractUser):
     )
     objects = Manager()
     updated_at = ModificationDateTimeField(_("updated at"))
+    # denormalized relation counters, kept up to date by users_app.signals
+    followers_count = models.PositiveIntegerField(default=0, editable=False)
+    followings_count = models.PositiveIntegerField(default=0, editable=False)
+    blockers_count = models.PositiveIntegerField(default=0, editable=False)
+    blockings_count = models.PositiveIntegerField(default=0, editable=False)
 
     USERNAME_FIELD = "email"  # for authentication
     REQUIRED_FIELDS = ("username", "first_name", "last_name")
@@ -90,22 +100,6 @@ class User(AbstractUser):
     def full_name(self) -> str:
         return super().get_full_name()
 
-    @property
-    def followings_count(self) -> int:
-        return self.followings.count()
-
-    @property
-    def followers_count(self):
-        return self.followers.count()
-
-    @property
-    def blockings_count(self) -> int:
-        return self.blockings.count()
-
-    @property
-    def blockers_count(self):
-        return self.blockers.count()
-
     def check_password(self, raw_password: str) -> bool:
         if not super().check_password(raw_password):
             raise ValidationError("user password is incorrect")
@@ -148,6 +142,9 @@ class User(AbstractUser):
     class Meta(AbstractUser.Meta):
         ordering = ["-date_joined"]
         db_table = "users_db"
+        indexes = [
+            models.Index(fields=["-date_joined", "-id"]),
+        ]
 
 
 class ForeignUser(models.ForeignKey):
@@ -181,6 +178,12 @@ class Follow(Common):
         related_name="followers",
     )
 
+    @staticmethod
+    def followed_by(user, outer_ref="pk"):
+        """EXISTS subquery telling whether user follows the outer row"""
+        follows = Follow.objects.filter(from_user=user, to_user=OuterRef(outer_ref))
+        return Exists(follows)
+
     class Meta:
         unique_together = ["from_user", "to_user"]
         db_table = "following_db"
@@ -198,6 +201,9 @@ class Follow(Common):
             raise ValidationError("cannot follow the already followed user")
 
 
+BLOCKED_IDS_KEY = "blocked-ids:{}"
+
+
 class Block(Common):
     from_user = ForeignUser(
         related_name="blockings",
@@ -213,6 +219,40 @@ class Block(Common):
         )
         return block_list.exists()
 
+    @staticmethod
+    def between(user, outer_ref="pk"):
+        """NOT EXISTS friendly subquery: a block between user and the outer row"""
+        outer = OuterRef(outer_ref)
+        return Exists(
+            Block.objects.filter(
+                Q(from_user=user, to_user=outer) | Q(from_user=outer, to_user=user)
+            )
+        )
+
+    @staticmethod
+    def relations_of(user):
+        """blocks made by or against user"""
+        return Block.objects.filter(Q(from_user=user) | Q(to_user=user))
+
+    @staticmethod
+    def blocked_ids(user):
+        """ids (as strings) of users that user blocked or is blocked by, cached
+        until one of user's block relations changes"""
+        key = BLOCKED_IDS_KEY.format(user.pk)
+        ids = cache.get(key)
+        if ids is None:
+            blocks = Block.relations_of(user)
+            ids = {
+                str(to_user if from_user == user.pk else from_user)
+                for from_user, to_user in blocks.values_list("from_user", "to_user")
+            }
+            cache.set(key, ids, timeout=None)
+        return ids
+
+    @staticmethod
+    def forget_blocked_ids(*user_ids):
+        cache.delete_many([BLOCKED_IDS_KEY.format(user_id) for user_id in user_ids])
+
     class Meta:
         unique_together = ["from_user", "to_user"]
         db_table = "blocking_db"
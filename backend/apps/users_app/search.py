@@ -0,0 +1,142 @@
+from django.conf import settings
+from django_redis import get_redis_connection
+from .models import User
+
+# username prefix index
+# a redis sorted set where every member is "<lowercase username>\0<user id>" with
+# the same score, so a prefix search is a single ZRANGEBYLEX over the range
+# [prefix, prefix\xff] (O(log n + m)), a hash keeps the indexed name of every
+# user to remove it when the user is renamed or deleted
+# saves index users as they come, so the index only covers everyone once
+# rebuild (run on deploy and daily by celery beat) has set BUILT_KEY, searches
+# read the database until then
+
+INDEX_KEY = "users:search"
+NAMES_KEY = "users:search:names"
+BUILT_KEY = "users:search:built"
+# while a rebuild runs, saves are written to its keys too and the changed users
+# are read again from the database before the swap, so none of them is lost
+NEW_SUFFIX = ":new"
+REBUILDING_KEY = "users:search:rebuilding"
+CHANGED_KEY = "users:search:changed"
+# a rebuild that died leaves the marker behind for this long at most
+REBUILD_TIMEOUT = 60 * 60
+SEPARATOR = "\0"
+
+
+def _connection():
+    return get_redis_connection("default")
+
+
+def _member(username, user_id):
+    return f"{username.lower()}{SEPARATOR}{user_id}"
+
+
+def _write(conn, user_id, member, suffix=""):
+    """sets the entry of user_id to member, removes it when member is None"""
+    index_key, names_key = INDEX_KEY + suffix, NAMES_KEY + suffix
+    old = conn.hget(names_key, str(user_id))
+    old = old.decode() if old else None
+    if old == member:
+        return
+    pipe = conn.pipeline()
+    if old:
+        pipe.zrem(index_key, old)
+    if member:
+        pipe.zadd(index_key, {member: 0})
+        pipe.hset(names_key, str(user_id), member)
+    else:
+        pipe.hdel(names_key, str(user_id))
+    pipe.execute()
+
+
+def _update(user_id, member):
+    conn = _connection()
+    _write(conn, user_id, member)
+    if conn.exists(REBUILDING_KEY):
+        # the rebuild may have read the user before this change
+        conn.sadd(CHANGED_KEY, str(user_id))
+        _write(conn, user_id, member, NEW_SUFFIX)
+
+
+def index_user(user):
+    _update(user.id, _member(user.username, user.id))
+
+
+def unindex_user(user_id):
+    _update(user_id, None)
+
+
+def _replay_changes(conn, batch_size):
+    """writes the users saved during the rebuild again, from the database"""
+    while changed := conn.spop(CHANGED_KEY, batch_size):
+        user_ids = [user_id.decode() for user_id in changed]
+        users = User.objects.filter(id__in=user_ids).values_list("id", "username")
+        members = {str(user_id): _member(name, user_id) for user_id, name in users}
+        for user_id in user_ids:
+            _write(conn, user_id, members.get(user_id), NEW_SUFFIX)
+
+
+def rebuild(batch_size=10000):
+    """rebuilds the index from the database next to the live one and swaps them"""
+    conn = _connection()
+    index_key, names_key = INDEX_KEY + NEW_SUFFIX, NAMES_KEY + NEW_SUFFIX
+    conn.delete(index_key, names_key, CHANGED_KEY)
+    conn.set(REBUILDING_KEY, 1, ex=REBUILD_TIMEOUT)
+    users = User.objects.values_list("id", "username").iterator(chunk_size=batch_size)
+    pipe = conn.pipeline(transaction=False)
+    count = 0
+    for count, (user_id, username) in enumerate(users, start=1):
+        member = _member(username, user_id)
+        pipe.zadd(index_key, {member: 0})
+        pipe.hset(names_key, str(user_id), member)
+        if count % batch_size == 0:
+            pipe.execute()
+    pipe.execute()
+    _replay_changes(conn, batch_size)
+    pipe = conn.pipeline()
+    pipe.delete(INDEX_KEY, NAMES_KEY)
+    for key, live_key in ((index_key, INDEX_KEY), (names_key, NAMES_KEY)):
+        if conn.exists(key):  # missing when there is no user
+            pipe.rename(key, live_key)
+    pipe.set(BUILT_KEY, 1)
+    pipe.delete(REBUILDING_KEY)
+    pipe.execute()
+    return count
+
+
+def search_ids(query):
+    """ids of users whose username starts with query, the exact match first and
+    then shorter usernames first, None when the index is not built"""
+    conn = _connection()
+    if not conn.exists(BUILT_KEY):
+        return None
+    prefix = query.lower().encode()
+    members = conn.zrangebylex(
+        INDEX_KEY,
+        b"[" + prefix,
+        b"[" + prefix + b"\xff",
+        start=0,
+        num=settings.USER_SEARCH_CANDIDATES,
+    )
+    matches = [member.decode().split(SEPARATOR) for member in members]
+    matches.sort(key=lambda match: (len(match[0]), match[0]))
+    return [user_id for _, user_id in matches]
+
+
+def search(queryset, query, limit):
+    """users of queryset whose username starts with query (case insensitive),
+    ranked like search_ids"""
+    ids = search_ids(query)
+    if ids is None:
+        # not built yet (or redis was flushed), fall back to the database
+        users = queryset.filter(username__istartswith=query)
+        return sorted(users[: settings.USER_SEARCH_CANDIDATES], key=_rank)[:limit]
+    allowed = set(map(str, queryset.filter(id__in=ids).values_list("id", flat=True)))
+    ids = [user_id for user_id in ids if user_id in allowed][:limit]
+    users = {str(user.id): user for user in queryset.filter(id__in=ids)}
+    return [users[user_id] for user_id in ids if user_id in users]
+
+
+def _rank(user):
+    return len(user.username), user.username.lower()
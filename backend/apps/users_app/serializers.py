@@ -10,6 +10,8 @@ from drf_queryfields.mixins import QueryFieldsMixin
 from rest_framework.exceptions import PermissionDenied
 from auth_app.serializers import PasswordField
 from drf_base64.fields import Base64ImageField
+from django.conf import settings
+from social_media_project.derivatives import derivative_urls
 from django.urls import resolve
 
 
@@ -25,22 +27,52 @@ def repr_data(value):
 OBJECT = {"id": "string", "username": "string", "name": "string"}
 
 
-class RelatedFollowers(serializers.RelatedField):
-    def to_representation(self, value):
-        return repr_data(value.from_user)
+def followed_by_viewer(serializer, instance):
+    # annotated on the whole page by the views, looked up otherwise
+    following = getattr(instance, "is_following", None)
+    request = serializer.context.get("request")
+    if following is None and request is not None and request.user.is_authenticated:
+        following = Follow.objects.filter(
+            from_user=request.user, to_user=instance
+        ).exists()
+    return following
 
 
-class RelatedFollowings(RelatedFollowers):
-    def to_representation(self, value):
-        return repr_data(value.to_user)
+@extend_schema_serializer(
+    examples=[OpenApiExample(name="follower", value=OBJECT, response_only=True)]
+)
+class FollowerSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Follow
+        fields = ()
+
+    def to_representation(self, instance):
+        return repr_data(instance.from_user)
+
+
+@extend_schema_serializer(
+    examples=[OpenApiExample(name="following", value=OBJECT, response_only=True)]
+)
+class FollowingSerializer(FollowerSerializer):
+    def to_representation(self, instance):
+        return repr_data(instance.to_user)
 
 
-class RelatedBlockers(RelatedFollowers):
-    ...
+@extend_schema_serializer(
+    examples=[OpenApiExample(name="blocker", value=OBJECT, response_only=True)]
+)
+class BlockerSerializer(FollowerSerializer):
+    class Meta:
+        model = Block
+        fields = ()
 
 
-class RelatedBlockings(RelatedFollowings):
-    ...
+@extend_schema_serializer(
+    examples=[OpenApiExample(name="blocking", value=OBJECT, response_only=True)]
+)
+class BlockingSerializer(BlockerSerializer):
+    def to_representation(self, instance):
+        return repr_data(instance.to_user)
 
 
 fields_representation = {
@@ -51,17 +83,24 @@ fields_representation = {
     "last_name": "string",
     "full_name": "string",
     "profile_pic": "example.com/media/profile_pictires/pic.jpg",
+    "profile_pic_derivatives": {
+        "64": {
+            "webp": "example.com/media/derivatives/9f/9f86d0.../64.webp",
+            "jpeg": "example.com/media/derivatives/9f/9f86d0.../64.jpeg",
+        },
+        "128": {
+            "webp": "example.com/media/derivatives/9f/9f86d0.../128.webp",
+            "jpeg": "example.com/media/derivatives/9f/9f86d0.../128.jpeg",
+        },
+    },
     "birth_date": "2000-03-23",
     "gender": "male",
     "bio": "string",
+    "is_following": True,
     "followers_count": 44,
-    "followers": [OBJECT],
     "followings_count": 22,
-    "followings": [OBJECT],
     "blockers_count": 12,
-    "blockers": [OBJECT],
     "blockings_count": 10,
-    "blockings": [OBJECT],
     "date_joined": "2022-12-12T12:18:43.499990Z",
     "updated_at": "2022-12-12T12:18:43.776489Z",
 }
@@ -69,10 +108,6 @@ fields_representation = {
 
 @extend_schema_serializer(
     exclude_fields=[
-        "followers",
-        "followings",
-        "blockers",
-        "blockings",
         "followers_count",
         "follwings_count",
         "blockers_count",
@@ -89,11 +124,9 @@ fields_representation = {
 )
 class ProfileSerializer(QueryFieldsMixin, WritableNestedModelSerializer):
 
-    followers = RelatedFollowers(many=True, read_only=True)
-    followings = RelatedFollowings(many=True, read_only=True)
-    blockers = RelatedBlockers(many=True, read_only=True)
-    blockings = RelatedBlockings(many=True, read_only=True)
     profile_pic = Base64ImageField()
+    profile_pic_derivatives = serializers.SerializerMethodField()
+    is_following = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -107,15 +140,13 @@ class ProfileSerializer(QueryFieldsMixin, WritableNestedModelSerializer):
             "gender",
             "birth_date",
             "profile_pic",
+            "profile_pic_derivatives",
             "bio",
+            "is_following",
             "followers_count",
-            "followers",
             "followings_count",
-            "followings",
             "blockers_count",
-            "blockers",
             "blockings_count",
-            "blockings",
             "date_joined",
             "updated_at",
         )
@@ -132,6 +163,24 @@ class ProfileSerializer(QueryFieldsMixin, WritableNestedModelSerializer):
             "last_name": {"write_only": True, "required": False},
         }
 
+    def get_profile_pic_derivatives(self, instance) -> dict:
+        # resized copies of the picture, empty until they are made
+        return derivative_urls(instance.profile_pic_digest, settings.AVATAR_WIDTHS)
+
+    def get_is_following(self, instance) -> bool:
+        return followed_by_viewer(self, instance)
+
+
+class ProfilePictureSerializer(serializers.ModelSerializer):
+    """profile picture sent as a multipart file, the streamed counterpart of
+    ProfileSerializer.profile_pic"""
+
+    profile_pic = serializers.ImageField()
+
+    class Meta:
+        model = User
+        fields = ("profile_pic",)
+
 
 class BasicDataSerializer(QueryFieldsMixin, serializers.ModelSerializer):
 
@@ -139,6 +188,8 @@ class BasicDataSerializer(QueryFieldsMixin, serializers.ModelSerializer):
 
     confirm_password = PasswordField(label="Again password")
 
+    is_following = serializers.SerializerMethodField()
+
     class Meta:
         model = User
         fields = [
@@ -149,6 +200,7 @@ class BasicDataSerializer(QueryFieldsMixin, serializers.ModelSerializer):
             "password",
             "full_name",
             "date_joined",
+            "is_following",
             "confirm_password",
         ]
         read_only_fields = ["full_name", "date_joined"]
@@ -158,6 +210,9 @@ class BasicDataSerializer(QueryFieldsMixin, serializers.ModelSerializer):
             "confirm_password": {"write_only": True},
         }
 
+    def get_is_following(self, instance) -> bool:
+        return followed_by_viewer(self, instance)
+
     def create(self, validated_data):
         # user model catch confirm_password value, although it has not confirm_password field
         validated_data.pop("confirm_password")
@@ -2,12 +2,17 @@ from django.db.models.signals import *
 from .models import User, Follow, Block
 from django.dispatch import receiver
 from notifications_app.tasks import delete_notifications
+from posts_app.signals import change_count
+from posts_app.tasks import backfill_timeline, remove_from_timeline
 from .tasks import (
     delete_following_relation,
+    make_profile_pic_derivatives,
     notifying_following,
     send_activation,
 )
 from django.db import transaction
+from social_media_project.response_cache import bump_on_commit
+from . import search
 
 
 @receiver(post_save, sender=User)
@@ -42,3 +47,100 @@ def notify_followed_user(created, instance, **kwargs):
 @receiver(post_delete, sender=Follow)
 def delete_follow_notification(instance, **kwargs):
     delete_notifications.delay(instance.id, "following_relation_id")
+
+
+@receiver(post_save, sender=Follow)
+def add_followee_posts(created, instance, **kwargs):
+    if created:
+        transaction.on_commit(
+            lambda: backfill_timeline.delay(instance.from_user_id, instance.to_user_id)
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def remove_followee_posts(instance, **kwargs):
+    transaction.on_commit(
+        lambda: remove_from_timeline.delay(instance.from_user_id, instance.to_user_id)
+    )
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user(instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {"last_login"}:
+        return  # logging in does not change any cached data
+    bump_on_commit(f"profile:{instance.username}", "users")
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow(instance, **kwargs):
+    bump_on_commit(
+        f"profile:{instance.from_user.username}",
+        f"profile:{instance.to_user.username}",
+        f"follows:{instance.from_user_id}",
+    )
+
+
+@receiver(post_save, sender=Block)
+@receiver(post_delete, sender=Block)
+def invalidate_block(instance, **kwargs):
+    bump_on_commit(
+        f"profile:{instance.from_user.username}",
+        f"profile:{instance.to_user.username}",
+        f"blocks:{instance.from_user_id}",
+        f"blocks:{instance.to_user_id}",
+    )
+    transaction.on_commit(
+        lambda: Block.forget_blocked_ids(instance.from_user_id, instance.to_user_id)
+    )
+
+
+@receiver(pre_save, sender=User)
+def reset_profile_pic_digest(instance, **kwargs):
+    # a picture assigned since the last save is stored by this save
+    if instance.profile_pic and not instance.profile_pic._committed:
+        instance.profile_pic_digest = ""
+        instance._derive_profile_pic = True
+
+
+@receiver(post_save, sender=User)
+def derive_profile_pic(instance, **kwargs):
+    if getattr(instance, "_derive_profile_pic", False):
+        instance._derive_profile_pic = False
+        transaction.on_commit(lambda: make_profile_pic_derivatives.delay(instance.id))
+
+
+@receiver(post_save, sender=User)
+def index_username(instance, update_fields=None, **kwargs):
+    if update_fields and "username" not in update_fields:
+        return
+    transaction.on_commit(lambda: search.index_user(instance))
+
+
+@receiver(post_delete, sender=User)
+def unindex_username(instance, **kwargs):
+    transaction.on_commit(lambda: search.unindex_user(instance.id))
+
+
+RELATION_COUNTERS = {
+    Follow: ("followings_count", "followers_count"),
+    Block: ("blockings_count", "blockers_count"),
+}
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_save, sender=Block)
+def increase_relation_counts(sender, instance, created, **kwargs):
+    if created:
+        from_field, to_field = RELATION_COUNTERS[sender]
+        change_count(User, instance.from_user_id, from_field, 1)
+        change_count(User, instance.to_user_id, to_field, 1)
+
+
+@receiver(post_delete, sender=Follow)
+@receiver(post_delete, sender=Block)
+def decrease_relation_counts(sender, instance, **kwargs):
+    from_field, to_field = RELATION_COUNTERS[sender]
+    change_count(User, instance.from_user_id, from_field, -1)
+    change_count(User, instance.to_user_id, to_field, -1)
@@ -10,6 +10,9 @@ from notifications_app.tasks import create_notification
 from .models import Block, Follow
 from django.db.models import Q
 from django.template.loader import render_to_string
+from django.conf import settings
+from social_media_project import derivatives
+from social_media_project.response_cache import bump
 
 
 @shared_task
@@ -29,6 +32,11 @@ def delete_expired_tokens():
     call_command(command_name="flushexpiredtokens")
 
 
+@shared_task(name="rebuild_user_search")
+def rebuild_user_search():
+    call_command(command_name="rebuildusersearch")
+
+
 def activation_url(url_name, uuid64, token):
     site = Site.objects.get_current()
     current_domain = site.domain
@@ -83,3 +91,20 @@ def delete_following_relation(block_id):
         follow_rel.delete()
     except Block.DoesNotExist:
         return "there is no following relation"
+
+
+@shared_task(name="make_profile_pic_derivatives")
+def make_profile_pic_derivatives(user_id):
+    user = get_user_model().objects.filter(id=user_id).first()
+    if user is None or not user.profile_pic:
+        return None
+    digest = derivatives.make_derivatives(
+        user.profile_pic, settings.AVATAR_WIDTHS, square=True
+    )
+    if digest:
+        # unless the picture changed again meanwhile
+        get_user_model().objects.filter(
+            id=user_id, profile_pic=user.profile_pic.name
+        ).update(profile_pic_digest=digest)
+        bump(f"profile:{user.username}", "users")
+    return digest
@@ -3,6 +3,8 @@ from rest_framework.test import APITestCase, URLPatternsTestCase
 import base64
 from django.urls import path, include, reverse
 from django.utils.crypto import get_random_string
+from django.test import TestCase
+from .models import Block, Follow, User
 
 
 class UserAuthTest(APITestCase, URLPatternsTestCase):
@@ -38,3 +40,80 @@ class UserAuthTest(APITestCase, URLPatternsTestCase):
         url = reverse("signin-user")
         response = self.client.post(path=url, data=cred)
         self.assertEquals(response.status_code, 200)
+
+
+class BlockFilteringTest(TestCase):
+    def create_user(self, username):
+        return User.objects.create_user(
+            username=username,
+            email=f"{username}@gmail.com",
+            password="password",
+            first_name="first_name",
+            last_name="last_name",
+        )
+
+    def test_blocked_users_are_excluded_in_one_query(self):
+        viewer = self.create_user("viewer")
+        blocked = self.create_user("blocked")
+        blocker = self.create_user("blocker")
+        other = self.create_user("other")
+        Block.objects.create(from_user=viewer, to_user=blocked)
+        Block.objects.create(from_user=blocker, to_user=viewer)
+
+        with self.assertNumQueries(1):
+            users = User.objects.filter(~Block.between(viewer))
+            usernames = set(users.values_list("username", flat=True))
+        self.assertEqual(usernames, {"viewer", "other"})
+
+
+class FollowStateTest(TestCase):
+    def test_is_following_for_a_page_in_one_query(self):
+        viewer = User.objects.create_user(
+            username="viewer_name",
+            email="viewer@gmail.com",
+            password="password",
+            first_name="first_name",
+            last_name="last_name",
+        )
+        users = [
+            User.objects.create_user(
+                username=f"user_name{i}",
+                email=f"user{i}@gmail.com",
+                password="password",
+                first_name="first_name",
+                last_name="last_name",
+            )
+            for i in range(3)
+        ]
+        Follow.objects.create(from_user=viewer, to_user=users[0])
+
+        with self.assertNumQueries(1):
+            users = User.objects.filter(id__in=[user.id for user in users])
+            users = users.annotate(is_following=Follow.followed_by(viewer))
+            state = {user.username: user.is_following for user in users}
+        self.assertEqual(
+            state, {"user_name0": True, "user_name1": False, "user_name2": False}
+        )
+
+
+class RelationCountersTest(TestCase):
+    def test_follow_and_block_counts(self):
+        users = [
+            User.objects.create_user(
+                username=f"user_name{i}",
+                email=f"user{i}@gmail.com",
+                password="password",
+                first_name="first_name",
+                last_name="last_name",
+            )
+            for i in range(3)
+        ]
+        Follow.objects.create(from_user=users[0], to_user=users[1])
+        Follow.objects.create(from_user=users[2], to_user=users[1])
+        Block.objects.create(from_user=users[1], to_user=users[2])
+        for user in users:
+            user.refresh_from_db()
+        self.assertEqual(users[1].followers_count, 2)
+        self.assertEqual(users[0].followings_count, 1)
+        self.assertEqual(users[1].blockings_count, 1)
+        self.assertEqual(users[2].blockers_count, 1)
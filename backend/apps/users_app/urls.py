@@ -4,11 +4,37 @@ from .views import *
 urlpatterns = [
     path("auth/register", RegisterAPIView.as_view(), name="user-create"),
     path("users", ListUsersView.as_view(), name="search-users"),
+    path("users/search", SearchUsersView.as_view(), name="search-usernames"),
     path(
         "user/<str:username>",
         ProfileView.as_view(),
         name="user-info",
     ),
+    path(
+        "user/<str:username>/picture",
+        ProfilePictureView.as_view(),
+        name="user-picture",
+    ),
+    path(
+        "user/<str:username>/followers",
+        FollowersView.as_view(),
+        name="user-followers",
+    ),
+    path(
+        "user/<str:username>/followings",
+        FollowingsView.as_view(),
+        name="user-followings",
+    ),
+    path(
+        "user/<str:username>/blockers",
+        BlockersView.as_view(),
+        name="user-blockers",
+    ),
+    path(
+        "user/<str:username>/blockings",
+        BlockingsView.as_view(),
+        name="user-blockings",
+    ),
     path("following/<str:username>", FollowView.as_view(), name="following"),
     path("blocking/<str:username>", BlockView.as_view(), name="blocking"),
 ]
@@ -6,6 +6,7 @@ from rest_framework.generics import (
     get_object_or_404,
     RetrieveUpdateDestroyAPIView,
     DestroyAPIView,
+    UpdateAPIView,
     GenericAPIView,
 )
 from drf_spectacular.utils import (
@@ -16,29 +17,41 @@ from drf_spectacular.utils import (
     OpenApiResponse,
 )
 from drf_spectacular.types import OpenApiTypes
-from rest_framework.pagination import PageNumberPagination
+from social_media_project.pagination import KeysetPagination
 from rest_framework.permissions import AllowAny
+from rest_framework.exceptions import NotFound
 from .models import Block
 from users_app.models import Follow
 from .serializers import (
     FollowSerializer,
     BasicDataSerializer,
     ProfileSerializer,
+    ProfilePictureSerializer,
     BlockSesrializer,
+    FollowerSerializer,
+    FollowingSerializer,
+    BlockerSerializer,
+    BlockingSerializer,
 )
 from django.utils.translation import gettext_lazy as _
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
-from django.views.decorators.vary import vary_on_headers
+from social_media_project.response_cache import cached_response
+from social_media_project.uploads import StreamedUploadMixin
+from django.conf import settings
+from . import search
 from .models import User, Block
 
 # Create your views here.
 
 
-class ListUsers(PageNumberPagination):
+class ListUsers(KeysetPagination):
+    ordering = ("-date_joined", "-id")
     page_size = 10
 
 
+class ListRelations(KeysetPagination):
+    ordering = ("-id",)
+
+
 class AbstractAPIView(GenericAPIView):
     serializer_class = BasicDataSerializer
     queryset = User.objects.all()
@@ -72,25 +85,62 @@ class ListUsersView(AbstractAPIView, ListAPIView):
         return self.queryset
 
     def filter_queryset(self, queryset):
-        curr_user = self.request.user
-        usernames = [
-            user.username
-            for user in queryset.all()
-            if Block.check_block_relation(curr_user, user)
-        ]
-        queryset = queryset.exclude(username__in=usernames)
-        return queryset
-
-    @method_decorator(cache_page(timeout=60 * 60 * 24, key_prefix="get-users"))
-    @method_decorator(
-        vary_on_headers(
-            "Authorization",
-        )
-    )
+        viewer = self.request.user
+        queryset = queryset.filter(~Block.between(viewer))
+        return queryset.annotate(is_following=Follow.followed_by(viewer))
+
+    def get_cache_resources(self):
+        viewer = self.request.user.pk
+        return ["users", f"blocks:{viewer}", f"follows:{viewer}"]
+
+    @cached_response()
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
 
+@extend_schema_view(
+    get=extend_schema(
+        description="takes the beginning of a username and returns the matching users, "
+        "the exact match first and then shorter usernames first",
+        operation_id="search users",
+        parameters=[
+            OpenApiParameter(
+                name="q", description="username prefix", type=str, required=True
+            ),
+            OpenApiParameter(
+                name="limit",
+                description=f"number of users, at most {settings.USER_SEARCH_MAX_LIMIT}",
+                type=int,
+            ),
+        ],
+    ),
+)
+class SearchUsersView(AbstractAPIView, ListAPIView):
+    pagination_class = None
+    http_method_names = ["get"]
+
+    @property
+    def limit(self):
+        try:
+            limit = int(self.request.GET.get("limit", settings.USER_SEARCH_LIMIT))
+        except ValueError:
+            limit = settings.USER_SEARCH_LIMIT
+        return max(1, min(limit, settings.USER_SEARCH_MAX_LIMIT))
+
+    def filter_queryset(self, queryset):
+        viewer = self.request.user
+        queryset = queryset.filter(~Block.between(viewer))
+        return queryset.annotate(is_following=Follow.followed_by(viewer))
+
+    def list(self, request, *args, **kwargs):
+        query = request.GET.get("q", "").strip()
+        if not query:
+            return Response([])
+        queryset = self.filter_queryset(self.get_queryset())
+        users = search.search(queryset, query, self.limit)
+        return Response(self.get_serializer(users, many=True).data)
+
+
 @extend_schema_view(
     post=extend_schema(
         operation_id="Register",
@@ -168,7 +218,15 @@ class ProfileView(RetrieveUpdateDestroyAPIView):
     queryset = User.objects.all()
     http_method_names = ["get", "patch", "delete"]
 
-    @method_decorator(cache_page(timeout=60 * 60 * 24, key_prefix="get-user-by-id"))
+    def get_queryset(self):
+        viewer = self.request.user
+        return super().get_queryset().annotate(is_following=Follow.followed_by(viewer))
+
+    def get_cache_resources(self):
+        viewer = self.request.user.pk
+        return [f"profile:{self.kwargs.get('username')}", f"follows:{viewer}"]
+
+    @cached_response()
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
@@ -185,6 +243,111 @@ class ProfileView(RetrieveUpdateDestroyAPIView):
         return super().patch(request, *args, **kwargs)
 
 
+@extend_schema_view(
+    put=extend_schema(
+        operation_id="upload profile picture",
+        description="streams a new profile picture (multipart, field 'profile_pic'), \
+            bigger pictures than the upload limit are refused with 413",
+    ),
+)
+class ProfilePictureView(StreamedUploadMixin, UpdateAPIView):
+    serializer_class = ProfilePictureSerializer
+    lookup_field = "username"
+    queryset = User.objects.all()
+    http_method_names = ["put"]
+
+    def get_max_upload_size(self):
+        return settings.PROFILE_PIC_MAX_SIZE
+
+    def get_object(self):
+        # the owner is checked before the body is read
+        user = super().get_object()
+        if self.request.user != user:
+            self.permission_denied(self.request)
+        return user
+
+
+@extend_schema_view(
+    get=extend_schema(
+        operation_id="list followers",
+        description="takes username and returns the users following them, newest first",
+    ),
+)
+class FollowersView(ListAPIView):
+    serializer_class = FollowerSerializer
+    pagination_class = ListRelations
+    http_method_names = ["get"]
+
+    def get_queryset(self):
+        username = self.kwargs.get("username")
+        return Follow.objects.filter(to_user__username=username).select_related(
+            "from_user"
+        )
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        # the user is only looked up when there is nothing to show
+        username = self.kwargs.get("username")
+        if not page and not User.objects.filter(username=username).exists():
+            raise NotFound()
+        return page
+
+    def get_cache_resources(self):
+        return [f"profile:{self.kwargs.get('username')}"]
+
+    @cached_response()
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+@extend_schema_view(
+    get=extend_schema(
+        operation_id="list followings",
+        description="takes username and returns the users they follow, newest first",
+    ),
+)
+class FollowingsView(FollowersView):
+    serializer_class = FollowingSerializer
+
+    def get_queryset(self):
+        username = self.kwargs.get("username")
+        return Follow.objects.filter(from_user__username=username).select_related(
+            "to_user"
+        )
+
+
+@extend_schema_view(
+    get=extend_schema(
+        operation_id="list blockers",
+        description="takes username and returns the users blocking them, newest first",
+    ),
+)
+class BlockersView(FollowersView):
+    serializer_class = BlockerSerializer
+
+    def get_queryset(self):
+        username = self.kwargs.get("username")
+        return Block.objects.filter(to_user__username=username).select_related(
+            "from_user"
+        )
+
+
+@extend_schema_view(
+    get=extend_schema(
+        operation_id="list blockings",
+        description="takes username and returns the users they block, newest first",
+    ),
+)
+class BlockingsView(FollowersView):
+    serializer_class = BlockingSerializer
+
+    def get_queryset(self):
+        username = self.kwargs.get("username")
+        return Block.objects.filter(from_user__username=username).select_related(
+            "to_user"
+        )
+
+
 @extend_schema_view(
     post=extend_schema(
         operation_id="follow a user",
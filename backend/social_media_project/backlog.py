@@ -0,0 +1,47 @@
+from itertools import islice
+from urllib.parse import parse_qs
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+# backlog sent to websocket clients when they connect,
+# clients pass the id of the last item they have seen as ?since=<id>
+
+
+def since_param(scope):
+    values = parse_qs(scope["query_string"].decode()).get("since")
+    return values[0] if values else None
+
+
+async def load_backlog(queryset, since_id=None):
+    """returns the newest rows of queryset created after the row since_id
+    (oldest first) and whether older rows were left out"""
+    if since_id:
+        try:
+            last = await queryset.filter(id=since_id).values("created", "id").afirst()
+        except ValidationError:
+            last = None
+        if last:
+            queryset = queryset.filter(
+                Q(created__gt=last["created"])
+                | Q(created=last["created"], id__gt=last["id"])
+            )
+    limit = settings.WEBSOCKET_BACKLOG_SIZE
+    rows = [row async for row in queryset.order_by("-created", "-id")[: limit + 1]]
+    truncated = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    return rows, truncated
+
+
+def backlog_frames(rows, truncated, serialize):
+    """splits rows in frames of serialized items, every frame carries the cursor
+    the client should send back on its next connection"""
+    rows = iter(rows)
+    while frame := list(islice(rows, settings.WEBSOCKET_BACKLOG_FRAME_SIZE)):
+        yield {
+            "action": "backlog",
+            "items": [serialize(row) for row in frame],
+            "since": str(frame[-1].id),
+            "truncated": truncated,
+        }
@@ -48,6 +48,18 @@ app.conf.beat_schedule = {
         "task": "clear_read_notifications",
         "schedule": timedelta(days=2),
     },
+    "reconcile-counters": {
+        "task": "reconcile_counters",
+        "schedule": timedelta(days=1),
+    },
+    "collect-blobs": {
+        "task": "collect_blobs",
+        "schedule": timedelta(days=1),
+    },
+    "rebuild-user-search": {
+        "task": "rebuild_user_search",
+        "schedule": timedelta(days=1),
+    },
 }
 
 # celery beat to schedule tasks with three types:
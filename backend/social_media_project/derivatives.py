@@ -0,0 +1,103 @@
+import hashlib
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# resized copies of the uploaded images, made by celery tasks after the upload
+# (users_app.tasks, posts_app.tasks); a copy is named after the sha256 of the
+# original content, so an image uploaded many times is resized once and a
+# derivative url never points at other bytes, nginx serves them as immutable
+
+PATH = "derivatives"
+# file extension: pillow format
+FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+CHUNK_SIZE = 64 * 1024
+
+
+def digest_of(file):
+    sha = hashlib.sha256()
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+        sha.update(chunk)
+    return sha.hexdigest()
+
+
+def derivative_name(digest, width, extension):
+    return f"{PATH}/{digest[:2]}/{digest}/{width}.{extension}"
+
+
+def derivative_urls(digest, widths):
+    """{width: {extension: url}} of the copies of the image with digest"""
+    if not digest:
+        return {}
+    return {
+        str(width): {
+            extension: default_storage.url(derivative_name(digest, width, extension))
+            for extension in FORMATS
+        }
+        for width in widths
+    }
+
+
+def delete_derivatives(digest):
+    for width in {*settings.AVATAR_WIDTHS, *settings.FEED_IMAGE_WIDTHS}:
+        for extension in FORMATS:
+            default_storage.delete(derivative_name(digest, width, extension))
+
+
+def image_url(field_file, digest, width):
+    """url of the width copy in the default format, of the original until the
+    copies are made"""
+    if digest:
+        extension = settings.IMAGE_DERIVATIVE_FORMAT
+        return default_storage.url(derivative_name(digest, width, extension))
+    return field_file.url if field_file else None
+
+
+def resize(image, width, square):
+    if square:
+        return ImageOps.fit(image, (width, width), Image.Resampling.LANCZOS)
+    if image.width <= width:
+        return image.copy()  # never upscaled
+    height = round(image.height * width / image.width)
+    return image.resize((width, height), Image.Resampling.LANCZOS)
+
+
+def encode(image, pillow_format):
+    if pillow_format == "JPEG" or image.mode not in ("RGB", "RGBA"):
+        has_alpha = "A" in image.mode or "transparency" in image.info
+        mode = "RGBA" if has_alpha and pillow_format != "JPEG" else "RGB"
+        image = image.convert(mode)
+    buffer = BytesIO()
+    image.save(buffer, pillow_format, quality=settings.IMAGE_DERIVATIVE_QUALITY)
+    return ContentFile(buffer.getvalue())
+
+
+def make_derivatives(field_file, widths, square=False):
+    """stores the missing copies of field_file and returns its digest,
+    None when it is not an image"""
+    # content addressed files are named after their digest already
+    known_digest = getattr(field_file.storage, "digest", None)
+    with field_file.open("rb") as file:
+        digest = known_digest and known_digest(field_file.name) or digest_of(file)
+        names = {
+            (width, extension): derivative_name(digest, width, extension)
+            for width in widths
+            for extension in FORMATS
+        }
+        missing = {key: n for key, n in names.items() if not default_storage.exists(n)}
+        if not missing:
+            return digest  # same content uploaded before
+        file.seek(0)
+        try:
+            image = Image.open(file)
+            # jpegs are decoded at the smallest scale still bigger than the copies
+            image.draft("RGB", (max(widths), max(widths)))
+            image = ImageOps.exif_transpose(image)
+        except (UnidentifiedImageError, OSError):
+            return None
+    for (width, extension), name in missing.items():
+        copy = resize(image, width, square)
+        default_storage.save(name, encode(copy, FORMATS[extension]))
+    return digest
@@ -0,0 +1,132 @@
+import re
+from uuid import uuid4
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from chats_app.models import Message
+from notifications_app.management.commands import clearreadnotifications
+from notifications_app.models import NotificationRef
+from notifications_app.views import ListNotifications
+from posts_app import timeline
+from posts_app.views import CommentPostView, LikeView, PostsView
+from users_app.management.commands import deleteinactivatedaccounts
+from users_app.models import Block, User
+from users_app.views import BlockersView, BlockingsView, FollowersView, FollowingsView
+
+# full table scans in query plans, per database vendor
+SCANS = {
+    "postgresql": re.compile(r"Seq Scan on (\w+)"),
+    "sqlite": re.compile(r"\bSCAN (\w+)\b(?! USING)"),
+}
+
+
+def hot_queries():
+    """the queries behind the feed, comments, likes, notifications, relation
+    lists, chat backlog and the retention jobs, built from the views, managers
+    and paginators that run them, for a made up viewer"""
+    viewer, some_id = User(pk=uuid4()), uuid4()
+    # what HideBlockedMixin and ViewerStateMixin add to the feed views
+    blocked = [str(uuid4())]
+
+    def feed(view):
+        return view.queryset.exclude(user_id__in=blocked).with_viewer_state(viewer)
+
+    def page(view, queryset, cursor=None):
+        return view.pagination_class().page_query(queryset, cursor, 20)
+
+    def relations(view):
+        return page(view, view(kwargs={"username": "someone"}).get_queryset())
+
+    cursor = (timezone.now(), some_id)
+    home_posts = timeline.home_window(
+        feed(PostsView),
+        [uuid4() for _ in range(21)],
+        timeline.followed_celebrities(viewer, [uuid4()]),
+        timezone.now(),
+    )
+    likes = LikeView.queryset.exclude(user_id__in=blocked)
+    notifications = ListNotifications.queryset.filter(receiver=viewer)
+    retention_batch = settings.RETENTION_BATCH_SIZE
+    return {
+        "home posts": page(PostsView, home_posts, cursor),
+        "user posts": page(PostsView, feed(PostsView).filter(user=viewer), cursor),
+        "post comments": page(
+            CommentPostView, feed(CommentPostView).filter(post_id=some_id, parent=None)
+        ),
+        "comment replies": page(
+            CommentPostView, feed(CommentPostView).filter(parent_id=some_id)
+        ),
+        "likes": page(LikeView, likes.of("post", some_id)),
+        "notifications": page(ListNotifications, notifications),
+        "unread notifications": page(
+            ListNotifications, notifications.filter(seen=False)
+        ),
+        "notification refs": NotificationRef.objects.filter(
+            key="post_id", value=str(some_id)
+        ),
+        "chat backlog": Message.objects.filter(room_id=some_id)
+        .select_related("sender")
+        .order_by("-created", "-id")[: settings.WEBSOCKET_BACKLOG_SIZE + 1],
+        "followers": relations(FollowersView),
+        "followings": relations(FollowingsView),
+        "blockers": relations(BlockersView),
+        "blockings": relations(BlockingsView),
+        "blocks": Block.relations_of(viewer).values_list("from_user", "to_user"),
+        "read notifications retention": clearreadnotifications.Command()
+        .get_queryset()
+        .values_list("pk", flat=True)[:retention_batch],
+        "inactivated accounts retention": deleteinactivatedaccounts.Command()
+        .get_queryset()
+        .values_list("pk", flat=True)[:retention_batch],
+    }
+
+
+def table_rows(table):
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            # planner estimate, a count(*) would scan the table itself
+            cursor.execute("SELECT reltuples FROM pg_class WHERE relname = %s", [table])
+        else:
+            cursor.execute(f"SELECT count(*) FROM {connection.ops.quote_name(table)}")
+        row = cursor.fetchone()
+    return int(row[0]) if row else 0
+
+
+class Command(BaseCommand):
+    """django command to explain the hot queries and fail when one of them scans a big table"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-rows",
+            type=int,
+            default=10000,
+            help="tables up to this many rows may be scanned",
+        )
+        parser.add_argument("--verbose-plans", action="store_true")
+
+    def handle(self, *args, **options):
+        scan = SCANS.get(connection.vendor)
+        if scan is None:
+            raise CommandError(f"plans of {connection.vendor} are not supported")
+        tables = {model._meta.db_table for model in apps.get_models()}
+        failures = []
+        for name, queryset in hot_queries().items():
+            plan = queryset.explain()
+            if options["verbose_plans"]:
+                self.stdout.write(f"{name}:\n{plan}\n")
+            scanned = [
+                (table, table_rows(table))
+                for table in set(scan.findall(plan))
+                if table in tables
+            ]
+            scanned = [(t, rows) for t, rows in scanned if rows > options["max_rows"]]
+            if scanned:
+                tables_text = ", ".join(f"{t} ({rows} rows)" for t, rows in scanned)
+                failures.append(f"{name}: full scan of {tables_text}")
+                self.stdout.write(self.style.ERROR(failures[-1]))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{name}: ok"))
+        if failures:
+            raise CommandError(f"{len(failures)} queries scan big tables")
@@ -0,0 +1,10 @@
+# deletes without the orm collector, for set based cascades and retention jobs
+# that do the work of the delete signals themselves
+
+
+def raw_delete(queryset):
+    """runs one DELETE ... WHERE for queryset and returns the deleted row count;
+    no signal is sent and no related row is collected, so every row pointing at
+    the deleted ones has to be deleted before. QuerySet._raw_delete is private
+    django api, posts_app.tests.CascadeTest checks it still behaves this way"""
+    return queryset._raw_delete(queryset.db)
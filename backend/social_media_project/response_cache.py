@@ -0,0 +1,69 @@
+import hashlib
+from functools import wraps
+from uuid import uuid4
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+# versioned response cache
+# every resource (a post, a user's profile, a home timeline, ...) has a generation
+# value, cached responses are keyed by the viewer, the url and the generations of
+# the resources they depend on, so changing a resource only rewrites its
+# generation and the old entries are never read again (they expire by timeout)
+
+GENERATION_KEY = "generation:{}"
+RESPONSE_KEY = "response:{}"
+
+
+def _generation_key(resource):
+    return GENERATION_KEY.format(resource)
+
+
+def bump(*resources):
+    """makes every cached response that depends on one of the resources stale"""
+    if resources:
+        new = {_generation_key(resource): uuid4().hex for resource in resources}
+        cache.set_many(new, timeout=None)
+
+
+def bump_on_commit(*resources):
+    transaction.on_commit(lambda: bump(*resources))
+
+
+def generations(resources):
+    keys = [_generation_key(resource) for resource in resources]
+    found = cache.get_many(keys)
+    missing = {key: uuid4().hex for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def response_key(request, resources):
+    parts = [str(request.user.pk), request.get_full_path()]
+    parts += [f"{r}={g}" for r, g in zip(resources, generations(resources))]
+    return RESPONSE_KEY.format(hashlib.md5("|".join(parts).encode()).hexdigest())
+
+
+def cached_response(timeout=None):
+    """caches successful responses of a view method per viewer,
+    the view must define get_cache_resources() returning the resources
+    the response depends on"""
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            key = response_key(request, view.get_cache_resources())
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+            response = method(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, timeout or settings.RESPONSE_CACHE_TIMEOUT)
+            return response
+
+        return wrapper
+
+    return decorator
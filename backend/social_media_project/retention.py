@@ -0,0 +1,85 @@
+import time
+from abc import ABC, abstractmethod
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+
+# base of the retention commands
+# rows are deleted in small batches, each one in its own short transaction,
+# so the api never waits long on their locks and cascades/signals only ever
+# load one batch in memory; the deletion rate can be capped to spare the database
+
+
+class BatchDeleteCommand(BaseCommand, ABC):
+    # tries of a batch that could not take its locks in time
+    retries = 3
+    # batches in a row that deleted nothing (rows deleted meanwhile by someone
+    # else, or rows that cannot be deleted) before the sweep gives up
+    empty_batches = 3
+
+    @abstractmethod
+    def get_queryset(self):
+        """the rows to delete"""
+
+    def delete_rows(self, pks):
+        """deletes the rows of pks and returns how many, through the collector
+        so the delete signals run; override it with raw deletes for tables
+        too big for a signal per row"""
+        model = self.get_queryset().model
+        _, deleted = model.objects.filter(pk__in=pks).delete()
+        return deleted.get(model._meta.label, 0)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.RETENTION_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=settings.RETENTION_MAX_ROWS_PER_SECOND,
+            help="max rows deleted per second, 0 for no limit",
+        )
+        parser.add_argument(
+            "--lock-timeout",
+            type=int,
+            default=settings.RETENTION_LOCK_TIMEOUT,
+            help="milliseconds a batch may wait for locks (postgresql)",
+        )
+
+    def set_lock_timeout(self, milliseconds):
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(f"SET LOCAL lock_timeout = {int(milliseconds)}")
+
+    def delete_batch(self, pks, lock_timeout):
+        for attempt in range(1, self.retries + 1):
+            try:
+                with transaction.atomic():
+                    self.set_lock_timeout(lock_timeout)
+                    return self.delete_rows(pks)
+            except OperationalError as error:
+                if attempt == self.retries:
+                    raise CommandError(f"batch could not be deleted: {error}")
+                self.stderr.write(f"batch locked ({error}), retrying")
+                time.sleep(attempt)
+
+    def handle(self, *args, **options):
+        batch_size, rate = options["batch_size"], options["rate"]
+        started, total, empty = time.monotonic(), 0, 0
+        while True:
+            pks = list(self.get_queryset().values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                break
+            deleted = self.delete_batch(pks, options["lock_timeout"])
+            empty = 0 if deleted else empty + 1
+            if empty >= self.empty_batches:
+                break  # rows are left, but they cannot be deleted
+            total += deleted
+            elapsed = time.monotonic() - started
+            if rate and total / rate > elapsed:
+                time.sleep(total / rate - elapsed)
+            elapsed = max(time.monotonic() - started, 0.001)
+            self.stdout.write(
+                f"deleted {total} rows in {elapsed:.1f}s ({total / elapsed:.0f} rows/s)"
+            )
+        self.stdout.write(self.style.SUCCESS(f"deleted {total} rows"))
@@ -4,6 +4,19 @@ from django.core.asgi import get_asgi_application
 from auth_app.ws_middlewares import WebSocketJWTAuthMiddleware
 from notifications_app.routing import notifs_urlpatterns
 from chats_app.routing import chats_urlpatterns
+from chats_app.buffer import message_buffer
+
+
+async def lifespan(scope, receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            # saves chat messages still waiting in the write-behind buffer
+            await message_buffer.flush()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
 
 
 application = ProtocolTypeRouter(
@@ -12,5 +25,6 @@ application = ProtocolTypeRouter(
         "websocket": WebSocketJWTAuthMiddleware(
             URLRouter(notifs_urlpatterns + chats_urlpatterns)
         ),
+        "lifespan": lifespan,
     }
 )
@@ -69,6 +69,8 @@ LOCAL_APPS = [
     "notifications_app.apps.NotificationsAppConfig",
     "auth_app.apps.AuthAppConfig",
     "chats_app.apps.ChatsAppConfig",
+    "media_app.apps.MediaAppConfig",
+    "social_media_project",  # commands that span every app
 ]
 
 INSTALLED_APPS = LOCAL_APPS + THIRD_PARTY_APPS + DEFAULT_APPS
@@ -156,7 +158,10 @@ SPECTACULAR_SETTINGS = {
     "SWAGGER_UI_DIST": "SIDECAR",  # shorthand to use the sidecar instead
     "SWAGGER_UI_FAVICON_HREF": "SIDECAR",
     "REDOC_DIST": "SIDECAR",
-    "PARSER_WHITELIST": ["rest_framework.parsers.JSONParser"],
+    "PARSER_WHITELIST": [
+        "rest_framework.parsers.JSONParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
     # OTHER SETTINGS
     "TITLE": "Social Media API",
     "DESCRIPTION": "This API is made with django and rest framework to simulate social media applications",
@@ -187,6 +192,7 @@ REST_FRAMEWORK = {
         "rest_framework_simplejwt.authentication.JWTAuthentication",
     ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_PAGINATION_CLASS": "social_media_project.pagination.KeysetPagination",
     "TEST_REQUEST_DEFAULT_FORMAT": "json",
     "SWAGGER_UI_SETTINGS": {
         "url": "/schema",  # relative path
@@ -216,6 +222,68 @@ CELERY_RESULT_BACKEND = REDIS_URL  # for caching
 CELERY_TIMEZONE = "Asia/Gaza"
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
+# every queue has its own workers (docker-compose.yml), so the pushes to the
+# websocket clients never wait behind fan-out, email or retention jobs;
+# unrouted tasks go to the fan-out queue
+CELERY_TASK_DEFAULT_QUEUE = "fanout"
+TASK_QUEUES = {
+    "realtime": [
+        "send_notifications",
+        "delete_from_client_side",
+        "mark_notification_as_read",
+        "create_notifications",
+        "create_following_notification",
+        "create_comment_notifications",
+        "create_like_notifications",
+    ],
+    "fanout": [
+        "create_post_notifications",
+        "fan_out_post_to_timelines",
+        "backfill_home_timeline",
+        "remove_from_home_timeline",
+        "remove_post_from_timelines",
+        "delete_instance_notification",
+        "delete_likes",
+        "delete_following_relation",
+        "purge_post_tree",
+        "purge_comment_tree",
+        "make_attachment_derivatives",
+        "make_profile_pic_derivatives",
+    ],
+    "email": ["send_email_activation"],
+    "maintenance": [
+        "delete_inactivated_users",
+        "delete_expired_tokens",
+        "clear_read_notifications",
+        "reconcile_counters",
+        "collect_blobs",
+        "rebuild_user_search",
+    ],
+}
+# within a queue, lower runs first (redis priorities), the rest get the default
+TASK_PRIORITIES = {
+    "send_notifications": 2,
+    "delete_from_client_side": 2,
+    "create_post_notifications": 6,
+    "backfill_home_timeline": 6,
+}
+CELERY_TASK_DEFAULT_PRIORITY = 4
+CELERY_TASK_ROUTES = {
+    task: {
+        "queue": queue,
+        "priority": TASK_PRIORITIES.get(task, CELERY_TASK_DEFAULT_PRIORITY),
+    }
+    for queue, tasks in TASK_QUEUES.items()
+    for task in tasks
+}
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    "queue_order_strategy": "priority",
+    "priority_steps": list(range(10)),
+    "sep": ":",
+}
+# a worker reserves one task per process, so a long fan-out job never holds
+# short tasks back, the realtime workers reserve more (docker-compose.yml)
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
 
 # redis (remote dictionary server) for caching
 CACHES = {
@@ -234,6 +302,70 @@ SESSION_ENGINE = "django.contrib.sessions.backends.cache"
 SESSION_CACHE_ALIAS = "default"
 CELERY_CACHE_BACKEND = "default"
 
+# social_media_project.response_cache
+RESPONSE_CACHE_TIMEOUT = 60 * 60 * 24
+# feeds also show counters that are not tracked by generations
+FEED_CACHE_TIMEOUT = 60
+
+# home timelines (posts_app.timeline)
+TIMELINE_MAX_LENGTH = config("TIMELINE_MAX_LENGTH", default=800, cast=int)
+# users with at least this number of followers are merged at read time
+TIMELINE_CELEBRITY_THRESHOLD = config(
+    "TIMELINE_CELEBRITY_THRESHOLD", default=10000, cast=int
+)
+TIMELINE_FANOUT_BATCH_SIZE = 1000
+TIMELINE_TTL = 60 * 60 * 24 * 7  # drop timelines of inactive users after a week
+
+# notifications_app.tasks.notify_followers
+NOTIFICATION_FANOUT_BATCH_SIZE = config(
+    "NOTIFICATION_FANOUT_BATCH_SIZE", default=1000, cast=int
+)
+# username search returns USER_SEARCH_LIMIT users by default, ranked among the
+# first USER_SEARCH_CANDIDATES usernames (in lexical order) sharing the prefix
+USER_SEARCH_LIMIT = 10
+USER_SEARCH_MAX_LIMIT = 50
+USER_SEARCH_CANDIDATES = 200
+# full-text search over posts and comments (posts_app.search), the engine is
+# picked from the database backend unless a dotted path is given
+TEXT_SEARCH_ENGINE = config("TEXT_SEARCH_ENGINE", default="")
+TEXT_SEARCH_CONFIG = "english"
+# retention commands (social_media_project.retention) delete in batches
+RETENTION_BATCH_SIZE = 1000
+RETENTION_MAX_ROWS_PER_SECOND = config(
+    "RETENTION_MAX_ROWS_PER_SECOND", default=5000, cast=int
+)
+RETENTION_LOCK_TIMEOUT = 2000  # milliseconds
+# multipart uploads (social_media_project.uploads) are streamed to temp files
+# and refused with 413 past these sizes, in bytes
+ATTACHMENT_MAX_SIZE = config("ATTACHMENT_MAX_SIZE", default=20 * 1024**2, cast=int)
+PROFILE_PIC_MAX_SIZE = config("PROFILE_PIC_MAX_SIZE", default=5 * 1024**2, cast=int)
+# resized copies of uploaded images (social_media_project.derivatives)
+AVATAR_WIDTHS = [64, 128]
+FEED_IMAGE_WIDTHS = [720]
+IMAGE_DERIVATIVE_FORMAT = "webp"  # of the single urls, like the user pictures
+IMAGE_DERIVATIVE_QUALITY = 80
+# uploads stored once per content (media_app.storage), opt-in
+CONTENT_ADDRESSED_UPLOADS = config(
+    "CONTENT_ADDRESSED_UPLOADS", default=False, cast=bool
+)
+BLOB_GRACE_HOURS = 24  # unreferenced blobs are kept that long for collectblobs
+
+# social_media_project.backlog, sent to websocket clients on connect
+WEBSOCKET_BACKLOG_SIZE = 100
+WEBSOCKET_BACKLOG_FRAME_SIZE = 50
+# chat messages are saved in batches of up to CHAT_BUFFER_SIZE,
+# at most CHAT_BUFFER_INTERVAL seconds after they are received
+CHAT_BUFFER_SIZE = config("CHAT_BUFFER_SIZE", default=200, cast=int)
+CHAT_BUFFER_INTERVAL = config("CHAT_BUFFER_INTERVAL", default=0.05, cast=float)
+# failed flushes of a batch before its messages are saved one by one
+CHAT_BUFFER_RETRIES = config("CHAT_BUFFER_RETRIES", default=3, cast=int)
+# longest wait between the flushes of a buffer that cannot be saved
+CHAT_BUFFER_MAX_BACKOFF = config("CHAT_BUFFER_MAX_BACKOFF", default=30, cast=float)
+# resolved chat rooms are cached in redis and in a small lru in every process
+CHAT_ROOM_CACHE_TIMEOUT = 60 * 60 * 24
+CHAT_ROOM_LOCAL_CACHE_SIZE = 10000
+CHAT_ROOM_LOCAL_CACHE_TTL = 60
+
 
 CHANNEL_LAYERS = {
     "default": {
@@ -0,0 +1,69 @@
+from abc import ABC, abstractmethod
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.parsers import MultiPartParser
+
+# streamed multipart uploads, the counterpart of the base64 json fields
+# the body is read chunk by chunk (FILE_UPLOAD_CHUNK_SIZE) into a temp file that
+# the storage then moves in place, so a worker only holds one chunk of an upload
+# in memory whatever its size, and an upload is cut off as soon as it is too big
+
+# room for the multipart headers and the other fields of the body
+BODY_OVERHEAD = 64 * 1024
+
+
+class FileTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "the uploaded file is too large"
+    default_code = "file_too_large"
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """writes every file of the body to disk and refuses files over max_size
+    bytes or more than max_files of them"""
+
+    def __init__(self, request, max_size, max_files=1):
+        super().__init__(request)
+        self.max_size = max_size
+        self.max_files = max_files
+        self.files = 0
+
+    def handle_raw_input(
+        self, input_data, META, content_length, boundary, encoding=None
+    ):
+        # refused before reading anything when the client announces a big body
+        if content_length > self.max_size * self.max_files + BODY_OVERHEAD:
+            raise FileTooLarge()
+
+    def new_file(self, *args, **kwargs):
+        self.files += 1
+        if self.files > self.max_files:
+            raise ValidationError(f"cannot upload more than {self.max_files} files")
+        return super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_size:
+            self.file.close()  # removes the temp file
+            raise FileTooLarge(f"files cannot be bigger than {self.max_size} bytes")
+        return super().receive_data_chunk(raw_data, start)
+
+
+class StreamedUploadMixin(ABC):
+    """reads the multipart body of the view with a LimitedUploadHandler"""
+
+    parser_classes = [MultiPartParser]
+    max_upload_files = 1
+
+    @abstractmethod
+    def get_max_upload_size(self):
+        """bytes a file of the upload may have"""
+
+    def initialize_request(self, request, *args, **kwargs):
+        # the handlers can only be swapped before the body is read
+        request.upload_handlers = [
+            LimitedUploadHandler(
+                request, self.get_max_upload_size(), self.max_upload_files
+            )
+        ]
+        return super().initialize_request(request, *args, **kwargs)
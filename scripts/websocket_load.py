@@ -0,0 +1,100 @@
+"""load test for the websocket consumers
+
+holds many idle notification sockets open against a running server and measures
+chat round trips (send -> broadcast back) while they are connected
+
+    python scripts/websocket_load.py --token <access token> --connections 10000 \\
+        --room <username>-<other username> --messages 1000
+
+needs the websockets package (see backend/requirements.txt), raise the open
+files limit (ulimit -n) before opening thousands of sockets
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import websockets
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def report(name, values):
+    print(
+        f"{name}: n={len(values)} "
+        f"mean={statistics.mean(values) * 1000 if values else 0:.1f}ms "
+        f"p50={percentile(values, 50) * 1000:.1f}ms "
+        f"p99={percentile(values, 99) * 1000:.1f}ms"
+    )
+
+
+async def idle_client(url, stats, done):
+    start = time.perf_counter()
+    try:
+        async with websockets.connect(url, open_timeout=60, ping_interval=None):
+            stats["connect"].append(time.perf_counter() - start)
+            await done.wait()
+    except (OSError, asyncio.TimeoutError, websockets.WebSocketException):
+        stats["failed"] += 1
+
+
+async def chat_client(url, messages, stats):
+    async with websockets.connect(url, open_timeout=60) as ws:
+        for i in range(messages):
+            text = f"load-{i}-{time.monotonic_ns()}"
+            start = time.perf_counter()
+            await ws.send(json.dumps({"type": "create", "message": text}))
+            while True:
+                event = json.loads(await ws.recv())
+                if event.get("action") == "send" and event["data"]["message"] == text:
+                    break
+            stats["round_trip"].append(time.perf_counter() - start)
+
+
+async def main(args):
+    base = args.url.rstrip("/")
+    stats = {"connect": [], "round_trip": [], "failed": 0}
+    done = asyncio.Event()
+    notifs_url = f"{base}/api/notifs/me?token={args.token}"
+
+    started = time.perf_counter()
+    clients = []
+    for i in range(args.connections):
+        clients.append(asyncio.create_task(idle_client(notifs_url, stats, done)))
+        if args.ramp and i % args.ramp == 0:
+            await asyncio.sleep(0.1)
+    while len(stats["connect"]) + stats["failed"] < args.connections:
+        await asyncio.sleep(0.5)
+    print(
+        f"connected {len(stats['connect'])}/{args.connections} sockets "
+        f"in {time.perf_counter() - started:.1f}s, {stats['failed']} failed"
+    )
+    report("connect", stats["connect"])
+
+    if args.room:
+        chat_url = f"{base}/api/chat/{args.room}?token={args.token}"
+        started = time.perf_counter()
+        await chat_client(chat_url, args.messages, stats)
+        elapsed = time.perf_counter() - started
+        print(f"chat: {args.messages / elapsed:.1f} messages/s")
+        report("round trip", stats["round_trip"])
+
+    done.set()
+    await asyncio.gather(*clients)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="ws://localhost:80")
+    parser.add_argument("--token", required=True, help="jwt access token")
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--ramp", type=int, default=500, help="sockets per 100ms")
+    parser.add_argument("--room", help="chat room name to measure round trips")
+    parser.add_argument("--messages", type=int, default=100)
+    asyncio.run(main(parser.parse_args()))